@@ -0,0 +1,49 @@
+import time
+import queue
+import logging
+import threading
+
+
+class BackgroundWriter:
+    # A single thread running write jobs (manifest appends, savefig) in submission order. The queue is
+    # bounded, so submit() blocks once max_pending jobs are waiting and a slow disk throttles the
+    # producer instead of piling up frames and figures in memory.
+    def __init__(self, max_pending=16, name='writer'):
+        self.queue = queue.Queue(maxsize=max(1, max_pending))
+        self.failures = 0
+        self.blocked_seconds = 0.0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            func, args = job
+            try:
+                func(*args)
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Background write {getattr(func, '__name__', func)} failed: {e}")
+
+    def submit(self, func, *args):
+        if self.closed:
+            raise RuntimeError("BackgroundWriter is closed")
+        start = time.perf_counter()
+        self.queue.put((func, args))
+        self.blocked_seconds += time.perf_counter() - start
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.queue.put(None)
+            self.thread.join()
+        return self.failures
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
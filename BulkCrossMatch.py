@@ -0,0 +1,205 @@
+import os
+import glob
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from CatalogLoader import erosita_catalogs
+from CrossMatch import CatalogTree, catalog_stamp, deduplicate_positions, match_radius_arcsec
+from ResultsStore import read_results
+
+object_columns = ['Name', 'Agnclass', 'RA', 'DEC', 'Sector', 'Camera', 'CCD']
+
+
+def position_key(name, ra, dec):
+    # A changed position for the same name is a new object as far as the match table is concerned.
+    return f"{name}|{float(ra)!r}|{float(dec)!r}"
+
+
+class MatchTable:
+    # Nearest source in every catalog for every object position matched so far, keyed by
+    # (position key, catalog stamp). The radius is applied when reading, so changing it needs no
+    # queries; a rewritten catalog gets a new stamp and is matched again.
+    def __init__(self, path):
+        self.path = path
+        self.rows = {}
+
+    def load(self):
+        self.rows = {}
+        if not os.path.exists(self.path):
+            return self.rows
+        try:
+            with np.load(self.path, allow_pickle=False) as archive:
+                for values in zip(archive['position_key'].tolist(), archive['catalog_stamp'].tolist(),
+                                  archive['catalog'].tolist(), archive['separation'].tolist(),
+                                  archive['source_index'].tolist(), archive['flux'].tolist(),
+                                  archive['flux_err'].tolist()):
+                    self.rows[values[0], values[1]] = values[2:]
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable match table {self.path}: {e}")
+            self.rows = {}
+        return self.rows
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        keys = list(self.rows)
+        values = list(self.rows.values())
+        columns = {
+            'position_key': np.array([key[0] for key in keys], dtype=str),
+            'catalog_stamp': np.array([key[1] for key in keys], dtype=str),
+            'catalog': np.array([value[0] for value in values], dtype=str),
+            'separation': np.array([value[1] for value in values], dtype=np.float64),
+            'source_index': np.array([value[2] for value in values], dtype=np.int64),
+            'flux': np.array([value[3] for value in values], dtype=np.float64),
+            'flux_err': np.array([value[4] for value in values], dtype=np.float64),
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **columns)
+        os.replace(tmp_path, self.path)
+        return self.path
+
+    def update(self, keys, ra, dec, catalog_files, cache_directory=None):
+        # Queries only the (object, catalog) pairs not in the table yet. Rows left over from older
+        # versions of the given catalogs are dropped. Returns the number of new pairs.
+        ra = np.asarray(ra, dtype=np.float64)
+        dec = np.asarray(dec, dtype=np.float64)
+        stamps = {catalog_path: catalog_stamp(catalog_path) for catalog_path in catalog_files}
+        current = set(stamps.values())
+        paths = {os.path.abspath(catalog_path) for catalog_path in catalog_files}
+        self.rows = {key: value for key, value in self.rows.items()
+                     if key[1] in current or os.path.abspath(value[0]) not in paths}
+
+        computed = 0
+        for catalog_path, stamp in stamps.items():
+            todo = np.array([i for i, key in enumerate(keys) if (key, stamp) not in self.rows], dtype=np.intp)
+            if len(todo) == 0:
+                logging.info(f"All {len(keys)} objects already matched against {catalog_path}")
+                continue
+            catalog = CatalogTree.load(catalog_path, cache_directory)
+            logging.info(f"Matching {len(todo)} new objects against {catalog_path} ({len(catalog)} sources)")
+            if len(catalog) == 0:
+                idx = np.full(len(todo), -1)
+                sep = np.full(len(todo), np.inf)
+            else:
+                idx, sep = catalog.query(ra[todo], dec[todo])
+            for i, source, separation in zip(todo.tolist(), idx.tolist(), sep.tolist()):
+                found = 0 <= source < len(catalog)
+                flux = float(catalog.columns['ML_FLUX'][source]) if found else np.nan
+                flux_err = float(catalog.columns['ML_FLUX_ERR'][source]) if found else np.nan
+                self.rows[keys[i], stamp] = (catalog_path, separation, source, flux, flux_err)
+            computed += len(todo)
+        return computed
+
+    def best_matches(self, keys, catalog_files, radius_arcsec=match_radius_arcsec):
+        # Same selection as CrossMatch.match_catalogs: the closest source within the radius across the
+        # catalogs, the earlier catalog winning on equal separations.
+        best_sep = np.full(len(keys), np.inf)
+        best_flux = np.full(len(keys), np.nan)
+        best_flux_err = np.full(len(keys), np.nan)
+        best_catalog = np.full(len(keys), -1)
+        for catalog_number, catalog_path in enumerate(catalog_files):
+            stamp = catalog_stamp(catalog_path)
+            for i, key in enumerate(keys):
+                row = self.rows.get((key, stamp))
+                if row is None:
+                    continue
+                _, separation, _, flux, flux_err = row
+                if separation < radius_arcsec and separation < best_sep[i]:
+                    best_sep[i] = separation
+                    best_flux[i] = flux
+                    best_flux_err[i] = flux_err
+                    best_catalog[i] = catalog_number
+        return {
+            'separation': best_sep,
+            'flux': best_flux,
+            'flux_err': best_flux_err,
+            'catalog': best_catalog,
+        }
+
+
+def load_objects(pattern='processed_light_curves*.npz', names=None):
+    files = sorted(glob.glob(pattern))
+    filters = None if names is None else {'Name': names}
+    tables = [read_results(path, columns=object_columns, filters=filters) for path in files]
+    if not tables:
+        return files, pd.DataFrame(columns=object_columns)
+    return files, pd.concat(tables, ignore_index=True)
+
+
+def unique_objects(objects, tolerance_arcsec=1.0):
+    # One row per sky position: rows within tolerance_arcsec of each other (the same object seen in
+    # several sectors or tables) collapse onto the first, with their sectors listed together.
+    if len(objects) == 0:
+        return objects.assign(Sectors=pd.Series(dtype=str), N_Rows=pd.Series(dtype=int))
+    representative = deduplicate_positions(objects['RA'].to_numpy(dtype=float), objects['DEC'].to_numpy(dtype=float),
+                                           tolerance_arcsec)
+    groups = objects.groupby(representative, sort=False)
+    unique = objects.iloc[np.unique(representative)].copy()
+    unique['Sectors'] = groups['Sector'].agg(lambda sectors: ','.join(sorted(set(map(str, sectors))))).loc[unique.index].values
+    unique['N_Rows'] = groups.size().loc[unique.index].values
+    return unique.reset_index(drop=True)
+
+
+def bulk_match(objects, catalog_files, table_path, radius_arcsec=match_radius_arcsec, cache_directory=None):
+    keys = [position_key(name, ra, dec) for name, ra, dec in zip(objects['Name'], objects['RA'], objects['DEC'])]
+    table = MatchTable(table_path)
+    table.load()
+    computed = table.update(keys, objects['RA'].to_numpy(dtype=float), objects['DEC'].to_numpy(dtype=float),
+                            catalog_files, cache_directory)
+    if computed:
+        table.save()
+    logging.info(f"Queried {computed} new object/catalog pairs, reused {len(keys) * len(catalog_files) - computed}")
+
+    match = table.best_matches(keys, catalog_files, radius_arcsec)
+    found = match['catalog'] >= 0
+    matched = objects.copy()
+    matched['Separation_arcsec'] = np.where(found, match['separation'], np.nan)
+    matched['eROSITA_Flux'] = match['flux']
+    matched['Flux_Error'] = match['flux_err']
+    matched['Catalog'] = [catalog_files[number] if number >= 0 else '' for number in match['catalog']]
+    return matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cross-match every processed object against the eRosita catalogs.')
+    parser.add_argument('catalogs', nargs='*', default=erosita_catalogs, help='eRosita FITS catalogs')
+    parser.add_argument('--light-curves', default='processed_light_curves*.npz',
+                        help='glob for processed light curve result stores (or text tables)')
+    parser.add_argument('--list-file', default=None, help='only match the names listed in this file')
+    parser.add_argument('--radius', type=float, default=match_radius_arcsec, help='match radius in arcsec')
+    parser.add_argument('--dedup-arcsec', type=float, default=1.0,
+                        help='rows closer than this are treated as one object (default: 1 arcsec)')
+    parser.add_argument('--match-table', default='crossmatch_cache/matches.npz',
+                        help='cached nearest-source table reused across runs')
+    parser.add_argument('--kdtree-cache', default='kdtree_cache', help='KD-tree cache directory')
+    parser.add_argument('-o', '--output', default='erosita_matches.tsv')
+    parser.add_argument('--matched-only', action='store_true', help='only write objects with a match')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    catalog_files = [path for path in args.catalogs if os.path.exists(path)]
+    for path in args.catalogs:
+        if path not in catalog_files:
+            logging.warning(f"Catalog not found, skipping: {path}")
+
+    names = None
+    if args.list_file is not None:
+        with open(args.list_file, 'r') as f:
+            names = set(f.read().splitlines())
+
+    files, objects = load_objects(args.light_curves, names)
+    objects = unique_objects(objects, args.dedup_arcsec)
+    logging.info(f"{len(objects)} unique objects from {len(files)} tables")
+
+    matched = bulk_match(objects, catalog_files, args.match_table, args.radius, args.kdtree_cache)
+    if args.matched_only:
+        matched = matched[matched['Catalog'] != '']
+    matched.to_csv(args.output, index=False, sep='\t', float_format='%.6e', na_rep='NaN')
+    logging.info(f"{int((matched['Catalog'] != '').sum())} matched objects written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
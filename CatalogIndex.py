@@ -0,0 +1,37 @@
+import numpy as np
+
+
+class CatalogIndex:
+    # Built once per HyperLedaCsv load so object and class lookups don't rescan the catalog.
+    def __init__(self, cat):
+        self.cat = cat
+        self.objname = np.asarray(cat.objname)
+        self.objtype = np.asarray(cat.objtype)
+        self.agnclass = np.asarray(cat.agnclass)
+        self.ra = np.asarray(cat.ra)
+        self.dec = np.asarray(cat.dec)
+
+        self.rows = {}
+        self.class_rows = {}
+        for row, (obj_name, agn_class) in enumerate(zip(self.objname.tolist(), self.agnclass.tolist())):
+            # First occurrence wins, matching cat.<field>[cat.objname == name][0].
+            self.rows.setdefault(obj_name, row)
+            self.class_rows.setdefault(agn_class, []).append(row)
+
+    def __len__(self):
+        return len(self.objname)
+
+    def __contains__(self, obj_name):
+        return obj_name in self.rows
+
+    def objects_in_class(self, agn_class):
+        return [self.objname[row] for row in self.class_rows.get(agn_class, [])]
+
+    def info(self, obj_name):
+        row = self.rows[obj_name]
+        return {
+            'Objtype': self.objtype[row],
+            'Agnclass': self.agnclass[row],
+            'RA': self.ra[row],
+            'DEC': self.dec[row],
+        }
@@ -0,0 +1,54 @@
+import logging
+import numpy as np
+import LightCurveCache
+
+catalog_columns = ('RA', 'DEC', 'ML_FLUX', 'ML_FLUX_ERR')
+erosita_catalogs = [
+    'eFEDS_c001_hard_V6.2.fits.gz',
+    'eFEDS_c001_main_V6.2.fits.gz',
+    'etaCha_c001_hard_V1.fits.gz',
+    'etaCha_c001_main_V1.fits.gz'
+]
+catalog_cache_directory = 'catalog_cache'
+
+
+def read_fits_columns(catalog_path, columns, optional=()):
+    from astropy.io import fits
+
+    with fits.open(catalog_path) as hdul:
+        table = hdul[1].data
+        present = set(table.columns.names)
+        names = list(columns) + [name for name in optional if name in present and name not in columns]
+        return {name: np.ascontiguousarray(table.field(name), dtype=np.float64) for name in names}
+
+
+def load_catalog_columns(catalog_path, columns=catalog_columns, cache_directory=catalog_cache_directory):
+    # The first call inflates the .fits.gz once and stores the standard eRosita columns (plus any extra
+    # requested ones) in the same memory-mappable .npy layout used for light curves.
+    columns = tuple(columns)
+    if cache_directory is None:
+        return read_fits_columns(catalog_path, columns)
+
+    cached = LightCurveCache.read_cache(catalog_path, cache_directory)
+    if cached is not None and all(name in cached for name in columns):
+        return {name: cached[name] for name in columns}
+
+    logging.info(f"Building column cache for {catalog_path}")
+    values = read_fits_columns(catalog_path, columns, catalog_columns + tuple(cached or ()))
+    try:
+        cache_path = LightCurveCache.write_cache(catalog_path, values, cache_directory)
+    except OSError as e:
+        logging.warning(f"Could not write column cache for {catalog_path} in {cache_directory}: {e}")
+        return {name: values[name] for name in columns}
+    cached = LightCurveCache.read_cache(catalog_path, cache_directory)
+    if cached is None:
+        logging.warning(f"Could not reopen column cache {cache_path}, using in-memory columns")
+        cached = values
+    return {name: cached[name] for name in columns}
+
+
+def load_catalogs(catalog_paths, columns=catalog_columns, cache_directory=catalog_cache_directory):
+    parts = [load_catalog_columns(path, columns, cache_directory) for path in catalog_paths]
+    if not parts:
+        return {name: np.array([], dtype=np.float64) for name in columns}
+    return {name: np.concatenate([part[name] for part in parts]) for name in columns}
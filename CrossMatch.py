@@ -0,0 +1,127 @@
+import os
+import pickle
+import hashlib
+import logging
+import numpy as np
+from CatalogLoader import load_catalog_columns
+
+match_radius_arcsec = 30
+
+
+def radec_to_unit(ra, dec):
+    ra = np.radians(np.asarray(ra, dtype=np.float64))
+    dec = np.radians(np.asarray(dec, dtype=np.float64))
+    cos_dec = np.cos(dec)
+    return np.column_stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)])
+
+
+def chord_to_arcsec(chord):
+    return np.degrees(2 * np.arcsin(np.clip(chord / 2, 0, 1))) * 3600
+
+
+def arcsec_to_chord(arcsec):
+    return 2 * np.sin(np.radians(np.asarray(arcsec, dtype=np.float64) / 3600) / 2)
+
+
+def catalog_stamp(catalog_path):
+    # Changes whenever the catalog file is replaced or rewritten.
+    stat = os.stat(catalog_path)
+    key = f"{os.path.abspath(catalog_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _tree_cache_path(catalog_path, cache_directory):
+    return os.path.join(cache_directory, f"{os.path.basename(catalog_path)}.{catalog_stamp(catalog_path)}.kdtree.pkl")
+
+
+def deduplicate_positions(ra, dec, tolerance_arcsec=1.0):
+    # Index of the representative (first) position for every input position. Positions closer than
+    # tolerance_arcsec are linked, and chains of links form one group (friends-of-friends).
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    from scipy.spatial import cKDTree
+
+    n = len(np.atleast_1d(ra))
+    if n == 0:
+        return np.array([], dtype=np.intp)
+    pairs = cKDTree(radec_to_unit(ra, dec)).query_pairs(arcsec_to_chord(tolerance_arcsec), output_type='ndarray')
+    graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+    n_groups, labels = connected_components(graph, directed=False)
+    first = np.full(n_groups, n, dtype=np.intp)
+    np.minimum.at(first, labels, np.arange(n))
+    return first[labels]
+
+
+class CatalogTree:
+    # One eRosita catalog with a KD-tree over unit vectors, so nearest-neighbour chord
+    # distance maps directly onto angular separation.
+    def __init__(self, catalog_path, tree, columns):
+        self.catalog_path = catalog_path
+        self.tree = tree
+        self.columns = columns
+
+    def __len__(self):
+        return self.tree.n
+
+    @classmethod
+    def build(cls, catalog_path, columns=('ML_FLUX', 'ML_FLUX_ERR'), cache_directory=None):
+        from scipy.spatial import cKDTree
+        catalog_data = load_catalog_columns(catalog_path, ('RA', 'DEC') + tuple(columns), cache_directory)
+        values = {name: np.array(catalog_data[name]) for name in columns}
+        return cls(catalog_path, cKDTree(radec_to_unit(catalog_data['RA'], catalog_data['DEC'])), values)
+
+    @classmethod
+    def load(cls, catalog_path, cache_directory=None):
+        if cache_directory is None:
+            return cls.build(catalog_path)
+
+        cache_path = _tree_cache_path(catalog_path, cache_directory)
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    tree, columns = pickle.load(f)
+                return cls(catalog_path, tree, columns)
+            except Exception as e:
+                logging.warning(f"Rebuilding unreadable KD-tree cache {cache_path}: {e}")
+
+        catalog = cls.build(catalog_path, cache_directory=cache_directory)
+        os.makedirs(cache_directory, exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((catalog.tree, catalog.columns), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+        return catalog
+
+    def query(self, ra, dec):
+        chord, idx = self.tree.query(radec_to_unit(ra, dec), k=1)
+        return idx, chord_to_arcsec(chord)
+
+
+def match_catalogs(ra, dec, catalog_files, radius_arcsec=match_radius_arcsec, cache_directory=None):
+    # Best match across all catalogs within radius_arcsec; on equal separations the earlier catalog wins.
+    ra = np.atleast_1d(np.asarray(ra, dtype=np.float64))
+    dec = np.atleast_1d(np.asarray(dec, dtype=np.float64))
+    best_sep = np.full(len(ra), np.inf)
+    best_flux = np.full(len(ra), np.nan)
+    best_flux_err = np.full(len(ra), np.nan)
+    best_catalog = np.full(len(ra), -1)
+
+    for catalog_number, catalog_path in enumerate(catalog_files):
+        catalog = CatalogTree.load(catalog_path, cache_directory)
+        logging.info(f"Matching {len(ra)} objects against {catalog_path} ({len(catalog)} sources)")
+        if len(catalog) == 0 or len(ra) == 0:
+            continue
+        idx, sep = catalog.query(ra, dec)
+
+        better = (sep < radius_arcsec) & (sep < best_sep)
+        best_sep[better] = sep[better]
+        best_flux[better] = catalog.columns['ML_FLUX'][idx[better]]
+        best_flux_err[better] = catalog.columns['ML_FLUX_ERR'][idx[better]]
+        best_catalog[better] = catalog_number
+
+    return {
+        'separation': best_sep,
+        'flux': best_flux,
+        'flux_err': best_flux_err,
+        'catalog': best_catalog,
+    }
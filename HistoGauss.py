@@ -1,17 +1,93 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import os
 import logging
-from scipy import stats
+from collections import namedtuple
 from LightCurve2 import LightCurveData
+from PlotQueue import PlotQueue
+
+HistogramStatistics = namedtuple('HistogramStatistics', [
+    'n_points', 'mean_flux', 'stddev', 'weighted_stddev',
+    'mu1', 'sigma1', 'chi2_1', 'reduced_chi2_1', 'hist1',
+    'mu2', 'sigma2', 'chi2_2', 'reduced_chi2_2', 'hist2',
+    'test1_data', 'test2_data',
+])
+
+
+def _gaussian_chi2(values, num_bins, expected=None, errors=None):
+    # Gaussian fit (same estimators as stats.norm.fit), histogram and chi2 of one test array.
+    # With expected/errors left as None the chi2 is taken against the fitted mu/sigma.
+    mu = values.mean()
+    deviation = values - mu
+    sigma = np.sqrt(np.mean(deviation * deviation))
+    if expected is None:
+        deviation /= sigma
+        chi2 = np.sum(deviation * deviation)
+    else:
+        deviation = (values - expected) / errors
+        chi2 = np.sum(deviation * deviation)
+    hist = np.histogram(values, bins=num_bins, density=True)
+    return mu, sigma, chi2, chi2 / (len(values) - 1), hist
+
+
+def histogram_statistics(cts, e_cts, num_bins=100, keep_data=False):
+    # Everything calculate_and_plot_histograms derives from a clipped light curve, computed straight
+    # from the cts/e_cts arrays without building pandas intermediates or the expected/error arrays.
+    cts = np.asarray(cts, dtype=np.float64)
+    e_cts = np.asarray(e_cts, dtype=np.float64)
+    n_points = len(cts)
+
+    mean_flux = np.nanmean(cts)
+    stddev = np.nanstd(cts, ddof=1)
+    weights = 1 / (e_cts * e_cts + 1e-10)
+    weight_sum = np.nansum(weights)
+    weighted_mean = np.nansum(weights * cts) / weight_sum
+    residual = cts - weighted_mean
+    weighted_stddev = np.sqrt(np.nansum(weights * residual * residual) / weight_sum)
+
+    test1_data = cts / stddev
+    if not np.all(np.isfinite(test1_data)):
+        return None
+    mu1, sigma1, chi2_1, reduced_chi2_1, hist1 = _gaussian_chi2(test1_data, num_bins)
+
+    test2_data = cts / e_cts
+    test2_data = test2_data[np.isfinite(test2_data)]
+    if len(test2_data) == 0:
+        return None
+    mu2, sigma2, chi2_2, reduced_chi2_2, hist2 = _gaussian_chi2(test2_data, num_bins, expected=0.0, errors=1.0)
+
+    return HistogramStatistics(
+        n_points, mean_flux, stddev, weighted_stddev,
+        mu1, sigma1, chi2_1, reduced_chi2_1, hist1,
+        mu2, sigma2, chi2_2, reduced_chi2_2, hist2,
+        test1_data if keep_data else None, test2_data if keep_data else None,
+    )
+
 
 class HistoGaussData:
-    def __init__(self, directory, save_directory, light_curve_data):
+    def __init__(self, directory, save_directory, light_curve_data, plotter=None):
         self.directory = directory
         self.save_directory = save_directory
         os.makedirs(self.save_directory, exist_ok=True)
-        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
         self.light_curve_data = light_curve_data
+        self.plotter = plotter if plotter is not None else PlotQueue()
+
+    def histogram_stats(self, clipped_data, num_bins=30):
+        from scipy import stats
+        n, bins = np.histogram(clipped_data, bins=num_bins, density=True)
+        mu, sigma = stats.norm.fit(clipped_data)
+        return n, bins, mu, sigma
+
+    def submit_histogram(self, data, mu, sigma, title, filename, num_bins=30):
+        if self.plotter.enabled:
+            self.plotter.submit({
+                'kind': 'histogram',
+                'title': title,
+                'save_path': os.path.join(self.save_directory, filename),
+                'data': np.asarray(data, dtype=np.float64),
+                'num_bins': num_bins,
+                'mu': mu,
+                'sigma': sigma,
+            })
 
     def plot_histogram(self, clipped_data, title, filename, num_bins=30):
         clipped_data = clipped_data[np.isfinite(clipped_data)]
@@ -19,20 +95,8 @@ class HistoGaussData:
             logging.warning(f"No finite data points for {title}")
             return None, None, None, None
 
-        plt.figure(figsize=(10, 6))
-        n, bins, _ = plt.hist(clipped_data, bins=num_bins, density=True, alpha=0.7)
-
-        mu, sigma = stats.norm.fit(clipped_data)
-        x = np.linspace(np.min(clipped_data), np.max(clipped_data), 100)
-        gaussian = stats.norm.pdf(x, mu, sigma)
-        plt.plot(x, gaussian, 'r-', lw=2, label='Gaussian fit')
-
-        plt.title(title)
-        plt.xlabel("Value")
-        plt.ylabel("Frequency")
-        plt.legend()
-        plt.savefig(os.path.join(self.save_directory, filename))
-        plt.close()
+        n, bins, mu, sigma = self.histogram_stats(clipped_data, num_bins)
+        self.submit_histogram(clipped_data, mu, sigma, title, filename, num_bins)
 
         return clipped_data, n, bins, mu, sigma
 
@@ -43,42 +107,20 @@ class HistoGaussData:
         return chi2, reduced_chi2
 
     def calculate_and_plot_histograms(self, clipped_data, obj_name, filename, num_bins=100):
-        mean_flux, stddev, weighted_stddev = self.light_curve_data.calculate_weighted_standard_deviation(clipped_data)
-        test1_data = clipped_data['cts'] / stddev
-        non_finite = np.sum(~np.isfinite(test1_data))
-        if non_finite > 0:
-            logging.warning(f"{obj_name}: Test 1 data contains {non_finite} non-finite values")
-            test1_data = test1_data[~np.isfinite(test1_data)]
-        _, n1, bins1, mu1, sigma1 = self.plot_histogram(
-            test1_data,
-            f"Test 1 Histogram for {obj_name}",
-            f"{obj_name}_test1_histogram.png",
-            num_bins
-        )
-        observed_1 = test1_data
-        expected_1 = np.full_like(observed_1, mu1)
-        errors_1 = np.full_like(observed_1, sigma1)
-        chi2_1, reduced_chi2_1 = self.calculate_chi2(observed_1, expected_1, errors_1)
-
-
-        test2_data = clipped_data['cts'] / clipped_data['e_cts']
-        non_finite = np.sum(~np.isfinite(test2_data))
-        if non_finite > 0:
-            logging.warning(f"{obj_name}: Test 2 data contains {non_finite} non-finite values")
-            test2_data = test2_data[np.isfinite(test2_data)]
-
-        _, n2, bins2, mu2, sigma2 = self.plot_histogram(
-            test2_data,
-            f"Test 2 Histogram for {obj_name}",
-            f"{obj_name}_test2_histogram.png",
-            num_bins
-        )
-
-        observed_2 = test2_data
-        expected_2 = np.zeros_like(observed_2)
-        errors_2 = np.ones_like(observed_2)
-        chi2_2, reduced_chi2_2 = self.calculate_chi2(observed_2, expected_2, errors_2)
-
-
-        return (chi2_1, reduced_chi2_1), (chi2_2, reduced_chi2_2), mean_flux, stddev
-        return None, None, None, None
+        if 'cts' not in clipped_data.columns or 'e_cts' not in clipped_data.columns:
+            logging.error("Columns 'cts' or 'e_cts' not found in the data.")
+            return None, None, None, None
+
+        statistics = histogram_statistics(clipped_data['cts'], clipped_data['e_cts'], num_bins,
+                                          keep_data=self.plotter.enabled)
+        if statistics is None:
+            logging.warning(f"{obj_name}: Test data contains no usable finite values")
+            return None, None, None, None
+
+        self.submit_histogram(statistics.test1_data, statistics.mu1, statistics.sigma1,
+                              f"Test 1 Histogram for {obj_name}", f"{obj_name}_test1_histogram.png", num_bins)
+        self.submit_histogram(statistics.test2_data, statistics.mu2, statistics.sigma2,
+                              f"Test 2 Histogram for {obj_name}", f"{obj_name}_test2_histogram.png", num_bins)
+
+        return ((statistics.chi2_1, statistics.reduced_chi2_1), (statistics.chi2_2, statistics.reduced_chi2_2),
+                statistics.mean_flux, statistics.stddev)
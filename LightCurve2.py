@@ -1,41 +1,284 @@
 import pandas as pd
-import matplotlib.pyplot as plt
+import io
 import os
+import glob
 import numpy as np
 import logging
+import LightCurveCache
+from PlotQueue import PlotQueue
+
+# The only lc_*_cleaned columns the analysis reads. Missing values are written as '-'.
+light_curve_columns = ('BTJD', 'cts', 'e_cts')
+
+
+def parse_light_curve(file_path, columns=light_curve_columns):
+    # The C parser handles the whitespace separator, '-' as NA and float64 conversion in one pass,
+    # without an object-dtype intermediate; columns=None keeps every column.
+    return pd.read_csv(file_path, sep=r'\s+', engine='c', usecols=None if columns is None else list(columns),
+                       na_values=['-'], dtype=np.float64)
+
+
+class LightCurveBundle:
+    # Every light curve of one directory in a single (n_points, n_columns) float64 array;
+    # curve i occupies rows offsets[i]:offsets[i + 1].
+    def __init__(self, names, paths, columns, values, offsets):
+        self.names = names
+        self.paths = paths
+        self.columns = tuple(columns)
+        self.values = values
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def column(self, name):
+        return self.values[:, self.columns.index(name)]
+
+    def curve(self, i):
+        rows = slice(self.offsets[i], self.offsets[i + 1])
+        return pd.DataFrame(self.values[rows], columns=list(self.columns), copy=False)
+
+
+def _data_rows(body):
+    # Rows the C parser will produce: it skips blank and whitespace-only lines.
+    return sum(1 for line in body.splitlines() if line.strip())
+
+
+def read_light_curve_directory(directory, columns=light_curve_columns):
+    # Bulk mode for a camX_ccdY/lc_hyperleda directory: the file bodies are joined and parsed by a
+    # single read_csv call. Files whose header differs from the first one are parsed on their own.
+    paths = sorted(glob.glob(os.path.join(directory, 'lc_*_cleaned')))
+    names = [os.path.basename(path)[len('lc_'):-len('_cleaned')] for path in paths]
+
+    header = None
+    bodies = []
+    lengths = np.zeros(len(paths), dtype=np.intp)
+    separate = {}
+    for i, path in enumerate(paths):
+        with open(path, 'rb') as f:
+            file_header = f.readline()
+            body = f.read()
+        if header is None:
+            header = file_header
+        if file_header.split() != header.split():
+            separate[i] = parse_light_curve(path, columns)[list(columns)].to_numpy(dtype=np.float64)
+            lengths[i] = len(separate[i])
+            continue
+        if body and not body.endswith(b'\n'):
+            body += b'\n'
+        bodies.append(body)
+        lengths[i] = _data_rows(body)
+
+    n_columns = len(columns)
+    if bodies:
+        joined = pd.read_csv(io.BytesIO(header + b''.join(bodies)), sep=r'\s+', engine='c', usecols=list(columns),
+                             na_values=['-'], dtype=np.float64)
+        joined = joined[list(columns)].to_numpy(dtype=np.float64)
+    else:
+        joined = np.empty((0, n_columns), dtype=np.float64)
+
+    offsets = np.zeros(len(paths) + 1, dtype=np.intp)
+    np.cumsum(lengths, out=offsets[1:])
+    joined_rows = offsets[-1] - sum(lengths[i] for i in separate)
+    if len(joined) != joined_rows:
+        raise ValueError(f"Row count mismatch while reading {directory}: parsed {len(joined)}, expected {joined_rows}")
+    if not separate:
+        values = joined
+    else:
+        values = np.empty((offsets[-1], n_columns), dtype=np.float64)
+        position = 0
+        for i in range(len(paths)):
+            part = separate[i] if i in separate else joined[position:position + lengths[i]]
+            if len(part) != lengths[i]:
+                raise ValueError(f"Row count mismatch for {paths[i]}: parsed {len(part)}, expected {lengths[i]}")
+            values[offsets[i]:offsets[i + 1]] = part
+            if i not in separate:
+                position += lengths[i]
+    return LightCurveBundle(names, paths, columns, values, offsets)
+
+
+def read_light_curve(file_path, cache_directory=None):
+    # parse_light_curve behind the optional binary cache; errors are left to the caller.
+    if cache_directory is None:
+        return parse_light_curve(file_path)
+
+    cached = LightCurveCache.read_cache_block(file_path, cache_directory)
+    if cached is not None:
+        # The transpose of the (n_columns, n) block is taken as the frame's single float64 block as is,
+        # so every column stays a read-only view into the memory-mapped cache file.
+        names, block = cached
+        return pd.DataFrame(block.T, columns=list(names), copy=False)
+
+    data = parse_light_curve(file_path)
+    try:
+        LightCurveCache.write_cache(file_path, {name: data[name].values for name in data.columns}, cache_directory)
+    except OSError as e:
+        # An unwritable or full cache volume only costs the speedup; the parsed curve is still good.
+        logging.warning(f"Could not write light curve cache for {file_path} in {cache_directory}: {e}")
+    return data
+
+
+def sigma_clip_mask(values, sigma=3, maxiters=5):
+    mask = np.ones(len(values), dtype=bool)
+    for _ in range(maxiters):
+        mean = np.mean(values[mask])
+        std = np.std(values[mask])
+        new_mask = np.abs(values - mean) < sigma * std
+
+        if np.all(new_mask == mask):
+            break
+        mask = new_mask
+    return mask
+
+
+def align_light_curve(data):
+    # Subtract the curve's median so sectors with different backgrounds line up. The cts are
+    # difference-imaging counts whose mean can be near zero or negative, so an additive offset is used
+    # rather than scaling by the mean flux; e_cts are unchanged.
+    cts = data['cts'].to_numpy(dtype=np.float64)
+    return cts - np.nanmedian(cts), data['e_cts'].to_numpy(dtype=np.float64)
+
+
+def stitch_light_curves(frames):
+    # One BTJD-ordered series from several per-sector curves, each aligned on its own first.
+    # A stable sort keeps each sector's original point order for equal timestamps.
+    btjd = np.concatenate([frame['BTJD'].to_numpy(dtype=np.float64) for frame in frames])
+    aligned = [align_light_curve(frame) for frame in frames]
+    cts = np.concatenate([values for values, _ in aligned])
+    e_cts = np.concatenate([errors for _, errors in aligned])
+    order = np.argsort(btjd, kind='stable')
+    return pd.DataFrame({'BTJD': btjd[order], 'cts': cts[order], 'e_cts': e_cts[order]})
+
+
+def pack_light_curves(curves, column='cts'):
+    lengths = np.array([len(curve) for curve in curves], dtype=np.intp)
+    values = np.zeros((len(curves), lengths.max() if len(curves) else 0), dtype=np.float64)
+    for row, curve in enumerate(curves):
+        curve_values = curve[column].values if hasattr(curve, 'columns') else curve
+        values[row, :lengths[row]] = curve_values
+    return values, lengths
+
+
+def _clip_row(values, mask, sigma):
+    mean = np.mean(values[mask])
+    std = np.std(values[mask])
+    return np.abs(values - mean) < sigma * std
+
+
+def sigma_clip_batch(values, lengths, sigma=3, maxiters=5):
+    # Same iteration as LightCurveData.sigma_clip_data, run for every row of a padded 2-D array at once.
+    # Returns the boolean masks (False in the padding) instead of clipped copies.
+    values = np.asarray(values, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.intp)
+    n_curves, width = values.shape
+    valid = np.arange(width) < lengths[:, None]
+    mask = valid.copy()
+    # The mask as float64 weights, kept up to date in place so the reductions are plain einsums.
+    weights = mask.astype(np.float64)
+    counts = lengths.astype(np.float64)
+    active = np.ones(n_curves, dtype=bool)
+    scale = np.abs(np.where(valid, values, 0)).max(axis=1, initial=0)
+    eps = np.finfo(np.float64).eps
+    distance = np.empty_like(values)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(maxiters):
+            rows = np.flatnonzero(active)
+            if len(rows) == 0:
+                break
+            # While most curves are still changing, work on the full arrays (views, no gathers) and
+            # ignore the finished rows; only a small remainder is compacted.
+            if 2 * len(rows) >= n_curves:
+                rows = slice(None)
+                row_values, row_weights, row_valid, row_mask = values, weights, valid, mask
+                row_distance = distance
+            else:
+                row_values, row_weights, row_valid, row_mask = values[rows], weights[rows], valid[rows], mask[rows]
+                row_distance = distance[:len(row_values)]
+
+            # Any NaN/inf already poisons the first, unclipped pass of the per-object loop, so the
+            # multiply-by-mask reductions give the same outcome for those curves.
+            row_counts = counts[rows]
+            mean = np.einsum('ij,ij->i', row_values, row_weights) / row_counts
+            np.subtract(row_values, mean[:, None], out=row_distance)
+            std = np.sqrt(np.einsum('ij,ij,ij->i', row_distance, row_distance, row_weights) / row_counts)
+            np.abs(row_distance, out=row_distance)
+            # These sums round differently from np.mean/np.std on a compacted copy, so points within
+            # rounding distance of the threshold are kept out of the vectorized decision and the rows
+            # holding any are re-decided with the per-object reductions.
+            threshold = sigma * std
+            n_used = np.maximum(row_counts, 1)
+            tolerance = 16 * eps * n_used * np.sqrt(n_used) * scale[rows] * (1 + sigma)
+            new_mask = row_distance < (threshold - tolerance)[:, None]
+            new_mask &= row_valid
+            near = row_distance <= (threshold + tolerance)[:, None]
+            near &= row_valid
+            near ^= new_mask
+            row_ids = np.arange(n_curves)[rows]
+            for i in np.flatnonzero(near.any(axis=1)):
+                n = lengths[row_ids[i]]
+                new_mask[i, :n] = _clip_row(row_values[i, :n], row_mask[i, :n], sigma)
+
+            changed = (new_mask != row_mask).any(axis=1) & active[rows]
+            active[row_ids[~changed]] = False
+            if isinstance(rows, slice) and changed.mean() > 0.5:
+                # Most rows moved: adopt the new mask wholesale, putting the few unchanged rows back.
+                new_mask[~changed] = mask[~changed]
+                mask = new_mask
+                np.copyto(weights, mask)
+                counts = np.count_nonzero(mask, axis=1).astype(np.float64)
+            else:
+                updated = row_ids[changed]
+                mask[updated] = new_mask[changed]
+                weights[updated] = new_mask[changed]
+                counts[updated] = np.count_nonzero(new_mask[changed], axis=1)
+
+    return mask
+
 
 class LightCurveData:
-    def __init__(self, directory, save_directory):
+    def __init__(self, directory, save_directory, cache_directory=None, plotter=None):
         self.directory = directory
         self.save_directory = save_directory
+        self.cache_directory = cache_directory
+        self.plotter = plotter if plotter is not None else PlotQueue()
         os.makedirs(self.save_directory, exist_ok=True)
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
     def load_data(self, filename):
         file_path = os.path.join(self.directory, filename)
         try:
-            data = pd.read_csv(file_path, sep=r'\s+')
-            data.columns = data.columns.str.strip()
-            data = data.replace('-', pd.NA).astype(float)
-            return data
+            return read_light_curve(file_path, self.cache_directory)
         except FileNotFoundError as e:
             logging.error(f"Failed to find the file {filename}: {e}")
         except Exception as e:
             logging.error(f"An error occurred while reading {filename}: {e}")
         return None
 
+    def load_stitched(self, file_paths):
+        # Stitching mode: the object's curves from several sectors merged into one median-aligned series.
+        frames = []
+        for file_path in file_paths:
+            try:
+                frames.append(read_light_curve(file_path, self.cache_directory))
+            except Exception as e:
+                logging.error(f"An error occurred while reading {file_path}: {e}")
+        if not frames:
+            return None
+        try:
+            return stitch_light_curves(frames)
+        except KeyError as e:
+            logging.error(f"Key error: {e} - Check that 'BTJD', 'cts', and 'e_cts' are in your data")
+        except Exception as e:
+            logging.error(f"An error occurred while stitching {len(frames)} light curves: {e}")
+        return None
+
     def sigma_clip_data(self, data, sigma=3, maxiters=5):
         try:
-            data_values = data['cts'].values
-            mask = np.ones(len(data_values), dtype=bool)
-            for _ in range(maxiters):
-                mean = np.mean(data_values[mask])
-                std = np.std(data_values[mask])
-                new_mask = np.abs(data_values - mean) < sigma * std
-
-                if np.all(new_mask == mask):
-                    break
-                mask = new_mask
+            mask = sigma_clip_mask(data['cts'].values, sigma, maxiters)
             clipped_data = data.iloc[mask]
             return clipped_data
 
@@ -46,7 +289,21 @@ class LightCurveData:
             logging.error(f"An error occurred during sigma clipping: {e}")
             return None
 
+    def sigma_clip_many(self, datasets, sigma=3, maxiters=5):
+        try:
+            values, lengths = pack_light_curves(datasets)
+            masks = sigma_clip_batch(values, lengths, sigma, maxiters)
+            return [masks[row, :lengths[row]] for row in range(len(datasets))]
+        except KeyError as e:
+            logging.error(f"Key error: {e} - Check that 'cts' is in your data")
+            return None
+        except Exception as e:
+            logging.error(f"An error occurred during sigma clipping: {e}")
+            return None
+
     def plot_light_curve(self, data, title, filename, agn_class):
+        if not self.plotter.enabled:
+            return
 
         type_save_directory = os.path.join(self.save_directory, agn_class)
         os.makedirs(type_save_directory, exist_ok=True)
@@ -58,15 +315,14 @@ class LightCurveData:
 
         if data is not None and not data.empty:
             try:
-                plt.figure(figsize=(10, 6))
-                plt.errorbar(data['BTJD'], data['cts'], yerr=data['e_cts'], fmt='o', color='blue', ecolor='lightgray', elinewidth=3, capsize=0)
-                plt.title(title)
-                plt.xlabel('BTJD (Barycentric TESS Julian Date)')
-                plt.ylabel('Counts (cts)')
-                plt.grid(True)
-                plt.savefig(save_path)
-                plt.close()
-                logging.info(f"Light Curve saved to {save_path}")
+                self.plotter.submit({
+                    'kind': 'light_curve',
+                    'title': title,
+                    'save_path': save_path,
+                    'btjd': data['BTJD'].to_numpy(dtype=np.float64),
+                    'cts': data['cts'].to_numpy(dtype=np.float64),
+                    'e_cts': data['e_cts'].to_numpy(dtype=np.float64),
+                })
             except KeyError as e:
                 logging.error(f"Key error: {e} - Check that 'BTJD', 'cts', and 'e_cts' are in your DataFrame")
             except Exception as e:
@@ -90,4 +346,3 @@ class LightCurveData:
             logging.error("Columns 'cts' or 'e_cts' not found in the data.")
             return None, None, None
 
-~                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                           ~                                                
@@ -0,0 +1,109 @@
+import os
+import glob
+import hashlib
+import logging
+import argparse
+import numpy as np
+
+
+# Each cached light curve is a single .npy holding a 0-d structured array whose fields are
+# fixed-length float64 sub-arrays, one per column. Loading it with mmap_mode='r' gives every
+# column as a contiguous, zero-copy view into the file, and since the fields are stored back to
+# back the whole record is also readable as one C-order (n_columns, n) float64 block.
+def _source_stamp(source_path):
+    stat = os.stat(source_path)
+    path_hash = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:12]
+    return path_hash, f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def cache_file_path(source_path, cache_directory):
+    path_hash, stamp = _source_stamp(source_path)
+    return os.path.join(cache_directory, f"{os.path.basename(source_path)}.{path_hash}.{stamp}.npy")
+
+
+def _load_record(source_path, cache_directory):
+    cache_path = cache_file_path(source_path, cache_directory)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        return np.load(cache_path, mmap_mode='r')
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable cache file {cache_path}: {e}")
+        return None
+
+
+def read_cache(source_path, cache_directory):
+    record = _load_record(source_path, cache_directory)
+    if record is None:
+        return None
+    return {name: record[name] for name in record.dtype.names}
+
+
+def read_cache_block(source_path, cache_directory):
+    # (column names, (n_columns, n) view of the memory-mapped file) or None when there is no cache entry.
+    record = _load_record(source_path, cache_directory)
+    if record is None:
+        return None
+    names = record.dtype.names
+    n = record.dtype[0].shape[0] if names else 0
+    return names, np.ndarray((len(names), n), dtype='<f8', buffer=record)
+
+
+def write_cache(source_path, columns, cache_directory):
+    os.makedirs(cache_directory, exist_ok=True)
+    cache_path = cache_file_path(source_path, cache_directory)
+
+    # Drop entries written for older versions of the same source file.
+    path_hash, _ = _source_stamp(source_path)
+    for stale in glob.glob(os.path.join(cache_directory, f"{glob.escape(os.path.basename(source_path))}.{path_hash}.*.npy")):
+        if stale != cache_path:
+            os.remove(stale)
+
+    n = len(next(iter(columns.values()))) if columns else 0
+    record = np.zeros((), dtype=[(name, '<f8', (n,)) for name in columns])
+    for name, values in columns.items():
+        record[name] = np.asarray(values, dtype=np.float64)
+
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, record)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def build_cache(sector_directory, cache_directory):
+    from LightCurve2 import parse_light_curve
+
+    sources = sorted(glob.glob(os.path.join(sector_directory, '**', 'lc_*_cleaned'), recursive=True))
+    logging.info(f"Found {len(sources)} light curve files under {sector_directory}")
+
+    built = 0
+    skipped = 0
+    for source_path in sources:
+        if os.path.exists(cache_file_path(source_path, cache_directory)):
+            skipped += 1
+            continue
+        try:
+            data = parse_light_curve(source_path)
+        except Exception as e:
+            logging.error(f"An error occurred while reading {source_path}: {e}")
+            continue
+        write_cache(source_path, {name: data[name].values for name in data.columns}, cache_directory)
+        built += 1
+
+    logging.info(f"Built {built} cache files, {skipped} already up to date")
+    return built
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prebuild the binary light curve cache for a sector directory.')
+    parser.add_argument('sector_directory', help='directory searched recursively for lc_*_cleaned files')
+    parser.add_argument('cache_directory', help='where the .npy cache files are written')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    build_cache(args.sector_directory, args.cache_directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import os
+import re
+import glob
+import logging
+from collections import OrderedDict, namedtuple
+from LightCurve2 import read_light_curve, sigma_clip_mask
+
+LightCurveLocation = namedtuple('LightCurveLocation', ['sector', 'cam', 'ccd', 'path'])
+
+_location_pattern = re.compile(r'sector(\d+)[/\\]cam(\d+)_ccd(\d+)[/\\]lc_hyperleda[/\\]lc_(.+)_cleaned$')
+
+
+def scan_light_curves(root, sectors=None):
+    # {name: [LightCurveLocation, ...]} for every root/sectorNN/camX_ccdY/lc_hyperleda/lc_<name>_cleaned,
+    # locations ordered by sector, camera and CCD.
+    sector_globs = ['sector*'] if sectors is None else [f"sector{int(sector):02d}" for sector in sectors]
+    index = {}
+    for sector_glob in sector_globs:
+        for path in glob.glob(os.path.join(root, sector_glob, 'cam*_ccd*', 'lc_hyperleda', 'lc_*_cleaned')):
+            match = _location_pattern.search(path)
+            if match is None:
+                continue
+            sector, cam, ccd, name = match.groups()
+            index.setdefault(name, []).append(LightCurveLocation(f"{int(sector):02d}", int(cam), int(ccd), path))
+    for locations in index.values():
+        locations.sort()
+    return index
+
+
+def _frame_bytes(data):
+    return int(data.memory_usage(index=True, deep=False).sum())
+
+
+class LightCurveRepository:
+    # Name -> light curve lookup across sectors/cameras/CCDs for notebooks and follow-up scripts.
+    # The directory tree is scanned once; curves are read on first access and kept in an LRU cache
+    # of raw and clipped frames that is trimmed back under memory_limit_mb after every insert.
+    def __init__(self, root, sectors=None, cache_directory=None, memory_limit_mb=512, sigma=3, maxiters=5):
+        self.root = root
+        self.sectors = sectors
+        self.cache_directory = cache_directory
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.sigma = sigma
+        self.maxiters = maxiters
+        self._frames = OrderedDict()
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.refresh()
+
+    def refresh(self):
+        self.index = scan_light_curves(self.root, self.sectors)
+        self.clear()
+        logging.info(f"Indexed {sum(len(locations) for locations in self.index.values())} light curves "
+                     f"for {len(self.index)} objects under {self.root}")
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return str(name) in self.index
+
+    def names(self):
+        return sorted(self.index)
+
+    def locations(self, name):
+        return list(self.index.get(str(name), []))
+
+    def locate(self, name, sector=None, cam=None, ccd=None):
+        locations = [location for location in self.locations(name)
+                     if (sector is None or location.sector == f"{int(sector):02d}")
+                     and (cam is None or location.cam == int(cam))
+                     and (ccd is None or location.ccd == int(ccd))]
+        if not locations:
+            raise KeyError(f"No light curve for {name} (sector={sector}, cam={cam}, ccd={ccd})")
+        if len(locations) > 1:
+            found = ', '.join(f"sector {loc.sector} cam {loc.cam} ccd {loc.ccd}" for loc in locations)
+            raise ValueError(f"{name} has several light curves ({found}); pass sector/cam/ccd to pick one")
+        return locations[0]
+
+    def raw(self, name, sector=None, cam=None, ccd=None):
+        return self._get(self.locate(name, sector, cam, ccd), clipped=False)
+
+    def clipped(self, name, sector=None, cam=None, ccd=None):
+        return self._get(self.locate(name, sector, cam, ccd), clipped=True)
+
+    def iter_curves(self, names=None, clipped=True):
+        # (name, location, frame) for every light curve of the given objects (default: all of them).
+        for name in (self.names() if names is None else names):
+            for location in self.locations(name):
+                yield str(name), location, self._get(location, clipped)
+
+    def _get(self, location, clipped):
+        key = (location.path, clipped)
+        if key in self._frames:
+            self.hits += 1
+            self._frames.move_to_end(key)
+            return self._frames[key][0]
+
+        self.misses += 1
+        if clipped:
+            data = self._get(location, clipped=False)
+            data = data.iloc[sigma_clip_mask(data['cts'].values, self.sigma, self.maxiters)]
+        else:
+            data = read_light_curve(location.path, self.cache_directory)
+        self._store(key, data)
+        return data
+
+    def _store(self, key, data):
+        n_bytes = _frame_bytes(data)
+        self._frames[key] = (data, n_bytes)
+        self.cached_bytes += n_bytes
+        # The newest frame is always returned to the caller even if it alone exceeds the ceiling.
+        while self.cached_bytes > self.memory_limit and len(self._frames) > 1:
+            _, (_, evicted_bytes) = self._frames.popitem(last=False)
+            self.cached_bytes -= evicted_bytes
+
+    def clear(self):
+        self._frames.clear()
+        self.cached_bytes = 0
+
+    def cache_info(self):
+        return {'objects': len(self.index), 'cached_frames': len(self._frames), 'cached_bytes': self.cached_bytes,
+                'memory_limit': self.memory_limit, 'hits': self.hits, 'misses': self.misses}
@@ -1,111 +1,560 @@
 import os
+import re
+import glob
+import argparse
+import threading
 import numpy as np
 import logging
-from catalogs.HyperLedaCsv import HyperLedaCsv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from LightCurve2 import LightCurveData
-from Histogram import HistoGaussData
-
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+from HistoGauss import HistoGaussData
+from CatalogIndex import CatalogIndex
+from PlotQueue import PlotQueue, PlotSpool, PLOT_MODES, render_specs
+from ResultsManifest import ResultsManifest, object_key
+from ResultsStore import results_schema, ResultsSpool
+from PipelineMetrics import ObjectTrace, PipelineMetrics, profiled
+from BackgroundWriter import BackgroundWriter
 
 root_directory = '/home/kicowlin/SummerResearch2024'
+catalog_root = 'HyperLEDA'
 agn_classes = ['S2', 'S1.5', 'S1.6', 'S1.7', 'S1.8', 'S1.9']
 
-def process_light_curves(cam, ccd, cat, agn_class, directory, save_directory):
-    results = []
-    mask = cat.agnclass == agn_class
+# Analysis parameters; they are part of each object's manifest key, so changing one reprocesses everything.
+analysis_params = {'sigma': 3, 'maxiters': 5, 'num_bins': 100}
+
+headers = [name for name, _ in results_schema]
+
+# Light curve / histogram managers and plot queues are reused across objects handled by the same process.
+# Prefetch threads create them concurrently, so creation is locked: a second PlotQueue for a mode would
+# collect specs that finish_unit never drains.
+_processors = {}
+_plotters = {}
+_processors_lock = threading.RLock()
+
+
+def get_plotter(plot_mode):
+    with _processors_lock:
+        if plot_mode not in _plotters:
+            _plotters[plot_mode] = PlotQueue(plot_mode)
+        return _plotters[plot_mode]
+
+
+def get_processors(directory, save_directory, agn_class, cache_directory=None, plot_mode='immediate'):
+    key = (directory, save_directory, agn_class, cache_directory, plot_mode)
+    with _processors_lock:
+        if key not in _processors:
+            class_save_directory = os.path.join(save_directory, agn_class)
+            os.makedirs(class_save_directory, exist_ok=True)
+            plotter = get_plotter(plot_mode)
+            light_curve_manager = LightCurveData(directory, save_directory, cache_directory, plotter)
+            histogram_processor = HistoGaussData(directory, class_save_directory, light_curve_manager, plotter)
+            _processors[key] = (light_curve_manager, histogram_processor)
+        return _processors[key]
+
+
+def build_work_units(cam, ccd, index, agn_class, directory, save_directory, cache_directory=None,
+                     plot_mode='immediate', sector='06'):
+    units = []
+    obj_names = index.objects_in_class(agn_class)
 
-    if not any(mask):
+    if not obj_names:
         logging.info(f"No {agn_class} objects found in Camera {cam} CCD {ccd}.")
-        return results
+        return units
 
-    logging.info(f"Processing Camera {cam} CCD {ccd} with {sum(mask)} {agn_class} objects...")
+    logging.info(f"Processing Camera {cam} CCD {ccd} with {len(obj_names)} {agn_class} objects...")
 
-    class_save_directory = os.path.join(save_directory, agn_class)
-    os.makedirs(class_save_directory, exist_ok=True)
+    for obj_name in obj_names:
+        unit = {
+            'sector': sector,
+            'cam': cam,
+            'ccd': ccd,
+            'agn_class': agn_class,
+            'directory': directory,
+            'save_directory': save_directory,
+            'cache_directory': cache_directory,
+            'plot_mode': plot_mode,
+            'params': analysis_params,
+            'Name': obj_name,
+        }
+        unit.update(index.info(obj_name))
+        units.append(unit)
+    return units
 
-    light_curve_manager = LightCurveData(directory, save_directory)
-    histogram_processor = HistoGaussData(directory, class_save_directory, light_curve_manager)
 
-    for obj_name in cat.objname[mask]:
+def load_unit(unit, trace):
+    # The I/O half of process_object: existence check and read. Returns None (with the trace status
+    # set) when the light curve is missing or unreadable.
+    light_curve_manager, _ = get_processors(unit['directory'], unit['save_directory'], unit['agn_class'],
+                                            unit['cache_directory'], unit['plot_mode'])
+    lc_file_paths = light_curve_paths(unit)
+
+    with trace.stage('exists'):
+        existing_paths = [path for path in lc_file_paths if os.path.exists(path)]
+    for path in lc_file_paths:
+        if path not in existing_paths:
+            logging.error(f"Light curve file does not exist: {path}")
+    if not existing_paths:
+        trace.set_status('missing')
+        return None
+
+    with trace.stage('load'):
+        if unit.get('stitched'):
+            data = light_curve_manager.load_stitched(existing_paths)
+        else:
+            data = light_curve_manager.load_data(f"lc_{unit['Name']}_cleaned")
+    if data is None:
+        trace.set_status('failed')
+        return None
+    trace.add_bytes(sum(os.path.getsize(path) for path in existing_paths))
+    return data
+
+
+def process_object(unit, trace=None, data=None):
+    # data is the frame already read by a prefetch thread; without it the light curve is loaded here.
+    obj_name = unit['Name']
+    cam, ccd, agn_class = unit['cam'], unit['ccd'], unit['agn_class']
+    light_curve_manager, histogram_processor = get_processors(unit['directory'], unit['save_directory'], agn_class,
+                                                              unit['cache_directory'], unit['plot_mode'])
+    if trace is None:
+        trace = ObjectTrace(unit_id(unit), obj_name)
+    plotter = histogram_processor.plotter
+
+    lc_file = f"lc_{obj_name}_cleaned"
+    if data is None:
         logging.info(f"Processing Object: {obj_name}")
+        data = load_unit(unit, trace)
+        if data is None:
+            return None
+    else:
+        logging.info(f"Processing Object: {obj_name} (prefetched)")
+
+    params = unit['params']
+    with trace.stage('sigma_clip'):
+        clipped_data = light_curve_manager.sigma_clip_data(data, params['sigma'], params['maxiters'])
+    # The clipped frame is a copy; drop the raw one before the statistics and plot stages.
+    del data
+    if clipped_data is None:
+        trace.set_status('failed')
+        return None
+
+    rendered_before = plotter.render_seconds
+    with trace.stage('statistics'):
+        chi2_results = histogram_processor.calculate_and_plot_histograms(clipped_data, obj_name, lc_file, params['num_bins'])
+    trace.move('statistics', 'render', plotter.render_seconds - rendered_before)
+
+    if chi2_results[0] is None or chi2_results[1] is None:
+        logging.warning(f"Chi-squared values could not be calculated for {obj_name}")
+        # Unlike a failed read, this outcome is fixed by the file contents, so the manifest may record it.
+        trace.set_status('rejected')
+        return None
+
+    (chi2_normalized, reduced_chi2_normalized), (chi2_standardized, reduced_chi2_standardized), mean_flux, std_dev = chi2_results
+
+    obj_info = {
+        'Name': obj_name,
+        'Objtype': unit['Objtype'],
+        'Agnclass': unit['Agnclass'],
+        'RA': unit['RA'],
+        'DEC': unit['DEC'],
+        'Mean_Flux': mean_flux,
+        'Stddev': std_dev,
+        'Sector': unit['sector'],
+        'Camera': f'{cam}',
+        'CCD': f'{ccd}',
+        'Chi2_Normalized': chi2_normalized,
+        'Chi2_reduced_Normalized': reduced_chi2_normalized,
+        'Chi2_Standardized': chi2_standardized,
+        'Chi2_reduced_Standardized': reduced_chi2_standardized
+    }
+    rendered_before = plotter.render_seconds
+    with trace.stage('plot_light_curve'):
+        light_curve_manager.plot_light_curve(clipped_data, obj_name + f'LightCurve', f"{obj_name}_LightCurve.png", agn_class)
+    trace.move('plot_light_curve', 'render', plotter.render_seconds - rendered_before)
+    return obj_info
+
+
+def light_curve_paths(unit):
+    directories = unit['directories'] if unit.get('stitched') else [unit['directory']]
+    return [os.path.join(directory, f"lc_{unit['Name']}_cleaned") for directory in directories]
+
+
+def stitch_units(units, save_directory):
+    # One unit per object and class, covering every sector/CCD directory that holds its light curve
+    # (catalogs list objects per camera, so most CCD directories don't). The joined Sector/Camera/CCD
+    # labels (e.g. '06+07', '1+2') end up in the stitched results table.
+    grouped = {}
+    for unit in units:
+        grouped.setdefault((unit['Name'], unit['agn_class']), []).append(unit)
+
+    stitched = []
+    for members in grouped.values():
+        present = [unit for unit in members if os.path.exists(light_curve_paths(unit)[0])]
+        members = present or members
+        stitched.append(dict(members[0], stitched=True, directory=None, save_directory=save_directory,
+                             directories=[unit['directory'] for unit in members],
+                             sector='+'.join(unit['sector'] for unit in members),
+                             cam='+'.join(str(unit['cam']) for unit in members),
+                             ccd='+'.join(str(unit['ccd']) for unit in members)))
+    return stitched
+
+
+def unit_id(unit):
+    if unit.get('stitched'):
+        return f"stitched/{unit['agn_class']}/{unit['Name']}"
+    return f"{unit['sector']}/{unit['cam']}/{unit['ccd']}/{unit['agn_class']}/{unit['Name']}"
+
+
+def check_manifest(unit, trace):
+    # Returns (key, unchanged). key stays None when there is no manifest or no light curve to hash.
+    if 'previous_key' not in unit:
+        return None, False
+    lc_file_paths = [path for path in light_curve_paths(unit) if os.path.exists(path)]
+    if not lc_file_paths:
+        return None, False
+    with trace.stage('manifest_hash'):
+        key = object_key(unit['Name'], lc_file_paths if unit.get('stitched') else lc_file_paths[0], unit['params'])
+    trace.add_bytes(sum(os.path.getsize(path) for path in lc_file_paths))
+    if key == unit['previous_key']:
+        logging.info(f"Skipping unchanged object: {unit['Name']}")
+        trace.set_status('skipped')
+        return key, True
+    return key, False
+
+
+def run_unit(unit):
+    trace = ObjectTrace(unit_id(unit), unit['Name'])
+    key, unchanged = check_manifest(unit, trace)
+    if unchanged:
+        return key, True, None, [], trace.record
+
+    result = process_object(unit, trace)
+    # Deferred plot specs travel back with the result so the parent can hand them to the render pool.
+    return key, False, result, get_plotter(unit['plot_mode']).drain(), trace.record
+
+
+def prefetch_unit(unit):
+    # Runs on an I/O thread: manifest hash and light curve read for an upcoming object.
+    trace = ObjectTrace(unit_id(unit), unit['Name'])
+    key, unchanged = check_manifest(unit, trace)
+    data = None if unchanged else load_unit(unit, trace)
+    return trace, key, unchanged, data
+
+
+def finish_unit(unit, prefetched):
+    trace, key, unchanged, data = prefetched
+    if unchanged:
+        return key, True, None, [], trace.record
+    result = None
+    if data is not None:
+        result = process_object(unit, trace, data)
+    return key, False, result, get_plotter(unit['plot_mode']).drain(), trace.record
+
 
-        lc_file = f"lc_{obj_name}_cleaned"
-        lc_file_path = os.path.join(light_curve_manager.directory, lc_file)
+def prefetch_map(units, depth, io_threads):
+    # At most depth objects are read ahead of the one being processed; the window only advances
+    # when the main thread takes the next object, which bounds the number of frames held in memory.
+    logging.info(f"Processing {len(units)} objects with {io_threads} prefetch thread(s), {depth} objects ahead")
+    positions = iter(range(len(units)))
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=io_threads) as executor:
+        def fill():
+            while len(pending) < depth:
+                position = next(positions, None)
+                if position is None:
+                    return
+                pending.append((position, executor.submit(prefetch_unit, units[position])))
 
-        if not os.path.exists(lc_file_path):
-            logging.error(f"Light curve file does not exist: {lc_file_path}")
+        fill()
+        while pending:
+            position, future = pending.popleft()
+            prefetched = future.result()
+            fill()
+            yield position, finish_unit(units[position], prefetched)
+
+
+def light_curve_size(unit):
+    size = 0
+    for path in light_curve_paths(unit):
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            pass
+    return size
+
+
+def map_units(units, workers=1, prefetch=0, io_threads=4):
+    # Yields (position in units, run_unit output). The parallel path submits the largest light curves
+    # first so long objects don't end up as stragglers; callers restore the original order by position.
+    if workers <= 1 and prefetch > 0:
+        yield from prefetch_map(units, prefetch, io_threads)
+        return
+    if workers <= 1:
+        yield from enumerate(map(run_unit, units))
+        return
+
+    logging.info(f"Processing {len(units)} objects with {workers} worker processes")
+    order = sorted(range(len(units)), key=lambda i: -light_curve_size(units[i]))
+    chunksize = max(1, len(units) // (workers * 32))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        outputs = executor.map(run_unit, [units[i] for i in order], chunksize=chunksize)
+        yield from zip(order, outputs)
+
+
+def run_work_units(units, workers=1, manifest=None, metrics=None, prefetch=0, io_threads=4, spool_directory=None):
+    if manifest is not None:
+        for unit in units:
+            unit['previous_key'] = manifest.key_for(unit_id(unit))
+
+    # Pipelined mode (serial runs only): reads happen on prefetch threads and a writer thread takes the
+    # manifest appends and the plots that would otherwise be drawn inline.
+    writer = None
+    if prefetch > 0 and workers <= 1:
+        writer = BackgroundWriter(prefetch)
+        for unit in units:
+            if unit['plot_mode'] == 'immediate':
+                unit['plot_mode'] = 'deferred'
+                unit['render_in_writer'] = True
+
+    # Results and deferred plot specs are spilled to disk as they arrive; the results spool puts
+    # them back in unit order when the tables are written.
+    results = ResultsSpool(spool_directory)
+    plot_specs = PlotSpool(spool_directory)
+    reused = 0
+    missing = set()
+    try:
+        for position, (key, unchanged, result, specs, trace) in map_units(units, workers, prefetch, io_threads):
+            unit = units[position]
+            if metrics is not None:
+                metrics.record(trace)
+            if manifest is not None:
+                if unchanged:
+                    reused += 1
+                elif trace['status'] == 'missing':
+                    missing.add(unit_id(unit))
+                elif key is not None and (result is not None or trace['status'] == 'rejected'):
+                    # Failed reads are left out so a transient I/O error is retried on the next run.
+                    if writer is not None:
+                        writer.submit(manifest.append, unit_id(unit), key, result)
+                    else:
+                        manifest.append(unit_id(unit), key, result)
+            if manifest is None and result is not None:
+                results.append(result, position)
+            if specs and unit.get('render_in_writer'):
+                writer.submit(render_specs, specs)
+            else:
+                plot_specs.extend(specs)
+    finally:
+        if writer is not None:
+            writer.close()
+            if metrics is not None:
+                metrics.add_stage('writer_backpressure', writer.blocked_seconds)
+
+    if manifest is not None:
+        logging.info(f"Reused {reused} of {len(units)} objects from manifest {manifest.path}")
+        # Light curves that have disappeared since an earlier run don't bring their old rows back.
+        for unit in missing:
+            manifest.discard(unit)
+        manifest.compact()
+        # The final table comes from the manifest, so resumed and freshly processed objects are treated alike.
+        # Results are streamed back from the manifest file one line at a time.
+        for result in manifest.iter_results(unit_id(unit) for unit in units):
+            if result is not None:
+                results.append(result)
+    return results.finish(), plot_specs
+
+
+def process_light_curves(cam, ccd, index, agn_class, directory, save_directory, cache_directory=None,
+                         plot_mode='immediate'):
+    units = build_work_units(cam, ccd, index, agn_class, directory, save_directory, cache_directory, plot_mode)
+    results, plot_specs = run_work_units(units)
+    with plot_specs:
+        render_specs(plot_specs)
+    with results:
+        return list(results.iter_results())
+
+
+def write_results(all_results, output_file):
+    max_widths = {header: len(header) for header in headers}
+    for result in all_results:
+        for header in headers:
+            value = str(result.get(header, ''))
+            max_widths[header] = max(max_widths[header], len(value))
+
+    with open(output_file, 'w') as file:
+        header_line = "".join(f"{header:<{max_widths[header] + 2}}" for header in headers)
+        file.write(header_line + "\n")
+
+        for result in all_results:
+            row = "".join(f"{str(result.get(header, '')):<{max_widths[header] + 2}}" for header in headers)
+            file.write(row + "\n")
+
+
+def parse_sectors(text):
+    # '6', '1-13', '1-5,7,9-10' -> sorted sector numbers
+    sectors = set()
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
             continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            sectors.update(range(int(first), int(last) + 1))
+        else:
+            sectors.add(int(part))
+    return sorted(sectors)
+
+
+def discover_ccd_directories(root, sector):
+    # {(cam, ccd): light curve directory} for every sectorNN/camX_ccdY/lc_hyperleda present on disk.
+    directories = {}
+    pattern = os.path.join(root, f"sector{sector:02d}", 'cam*_ccd*', 'lc_hyperleda')
+    for directory in glob.glob(pattern):
+        match = re.search(r'cam(\d+)_ccd(\d+)', os.path.basename(os.path.dirname(directory)))
+        if match:
+            directories[(int(match.group(1)), int(match.group(2)))] = directory
+    return dict(sorted(directories.items()))
+
+
+def build_sector_units(sector, root, cache_directory=None, plot_mode='immediate'):
+    from catalogs.HyperLedaCsv import HyperLedaCsv
 
-        data = light_curve_manager.load_data(lc_file)
-        if data is not None:
-            clipped_data = light_curve_manager.sigma_clip_data(data)
-            if clipped_data is not None:
-
-                chi2_results = histogram_processor.calculate_and_plot_histograms(clipped_data, obj_name, lc_file)
-
-                if chi2_results[0] is None or chi2_results[1] is None:
-                    logging.warning(f"Chi-squared values could not be calculated for {obj_name}")
-                    continue
-
-                (chi2_normalized, reduced_chi2_normalized), (chi2_standardized, reduced_chi2_standardized), mean_flux, std_dev = chi2_results
-
-                obj_info = {
-                    'Name': obj_name,
-                    'Objtype': cat.objtype[cat.objname == obj_name][0],
-                    'Agnclass': cat.agnclass[cat.objname == obj_name][0],
-                    'RA': cat.ra[cat.objname == obj_name][0],
-                    'DEC': cat.dec[cat.objname == obj_name][0],
-                    'Mean_Flux': mean_flux,
-                    'Stddev': std_dev,
-                    'Sector': '06',
-                    'Camera': f'{cam}',
-                    'CCD': f'{ccd}',
-                    'Chi2_Normalized': chi2_normalized,
-                    'Chi2_reduced_Normalized': reduced_chi2_normalized,
-                    'Chi2_Standardized': chi2_standardized,
-                    'Chi2_reduced_Standardized': reduced_chi2_standardized
-                }
-                results.append(obj_info)
-                light_curve_manager.plot_light_curve(clipped_data, obj_name + f'LightCurve', f"{obj_name}_LightCurve.png", agn_class)
-    return results
-
-
-def main():
-    all_results = []
-    for cam in range(1, 5):
-        for ccd in range(1, 5):
-            camera_files = [f"HyperLEDA/s06/hyperleda_s06_cam{cam}.txt"]
-            directory = f'{root_directory}/sector06/cam{cam}_ccd{ccd}/lc_hyperleda'
-            save_directory = f'{root_directory}/plots/Sector06'
-
-            light_curve_manager = LightCurveData(directory, save_directory)
-
-            for cam_file in camera_files:
-                cat = HyperLedaCsv(cam_file)
+    label = f"{sector:02d}"
+    save_directory = f'{root}/plots/Sector{label}'
+    os.makedirs(save_directory, exist_ok=True)
+
+    ccd_directories = discover_ccd_directories(root, sector)
+    if not ccd_directories:
+        logging.warning(f"No cam/ccd light curve directories found for sector {label} under {root}")
+
+    units = []
+    for cam in sorted({cam for cam, _ in ccd_directories}):
+        camera_files = [f"{catalog_root}/s{label}/hyperleda_s{label}_cam{cam}.txt"]
+        indexes = [CatalogIndex(HyperLedaCsv(cam_file)) for cam_file in camera_files]
+
+        for (dir_cam, ccd), directory in ccd_directories.items():
+            if dir_cam != cam:
+                continue
+            for index in indexes:
                 for agn_class in agn_classes:
-                    results = process_light_curves(cam, ccd, cat, agn_class, directory, save_directory)
-                    all_results.extend(results)
-                    logging.debug(f"Current all_results length: {len(all_results)}")
+                    units.extend(build_work_units(cam, ccd, index, agn_class, directory, save_directory,
+                                                   cache_directory, plot_mode, label))
+                    logging.debug(f"Current work unit count: {len(units)}")
+    return units
 
 
-    if all_results:
-        headers = ["Name", "Objtype", "Agnclass", "RA", "DEC", "Mean_Flux", "Stddev",
-                   "Sector", "Camera", "CCD", "Chi2_Normalized", "Chi2_reduced_Normalized",
-                   "Chi2_Standardized", "Chi2_reduced_Standardized"]
+def write_outputs(results, rows, output_file, text_table=False):
+    results.write_store(f"{output_file}.npz", rows)
+    if text_table:
+        write_results(results.view(rows), f"{output_file}.txt")
+
+
+def main(workers=1, cache_directory=None, plot_mode='immediate', render_workers=1, manifest_path=None,
+         text_table=False, trace_path=None, sectors=(6,), root=None, stitch=False, prefetch=0, io_threads=4,
+         spool_directory=None, features=False):
+    root = root_directory if root is None else root
+    metrics = PipelineMetrics(trace_path)
+
+    units = []
+    with metrics.stage('catalogs'):
+        for sector in sectors:
+            units.extend(build_sector_units(sector, root, cache_directory, plot_mode))
+        if stitch:
+            units = stitch_units(units, f'{root}/plots/Stitched')
+    logging.info(f"Scheduled {len(units)} objects across sectors {', '.join(f'{sector:02d}' for sector in sectors)}")
+
+    manifest = None
+    if manifest_path is not None:
+        manifest = ResultsManifest(manifest_path)
+        manifest.load()
+
+    all_results, plot_specs = run_work_units(units, workers, manifest, metrics, prefetch, io_threads, spool_directory)
+
+    with metrics.stage('write_results'), all_results:
+        if stitch:
+            if len(all_results):
+                write_outputs(all_results, all_results.rows(), 'stitched_light_curves', text_table)
+        else:
+            for sector in sectors:
+                label = f"{sector:02d}"
+                sector_rows = all_results.rows({'Sector': label})
+                if len(sector_rows):
+                    write_outputs(all_results, sector_rows, f'processed_light_curves_sector{label}', text_table)
+            # Named so the processed_light_curves* globs in the analysis scripts don't count rows twice.
+            if len(sectors) > 1 and len(all_results):
+                write_outputs(all_results, all_results.rows(), 'all_sectors_light_curves', text_table)
+
+    if features:
+        from VariabilityFeatures import write_sector_features
+        with metrics.stage('features'):
+            write_sector_features(root, 'variability_features.npz', sectors, cache_directory,
+                                  sigma=analysis_params['sigma'], maxiters=analysis_params['maxiters'])
+
+    with metrics.stage('render_deferred'), plot_specs:
+        render_specs(plot_specs, render_workers)
+
+    return metrics.close()
 
-        max_widths = {header: len(header) for header in headers}
-        for result in all_results:
-            for header in headers:
-                value = str(result.get(header, ''))
-                max_widths[header] = max(max_widths[header], len(value))
 
-        with open('processed_light_curves_sector06.txt', 'w') as file:
-            header_line = "".join(f"{header:<{max_widths[header] + 2}}" for header in headers)
-            file.write(header_line + "\n")
+def parse_args():
+    parser = argparse.ArgumentParser(description='Process TESS light curves of HyperLEDA AGN.')
+    parser.add_argument('-s', '--sectors', type=parse_sectors, default=[6],
+                        help="sectors to process, e.g. '6', '1-13' or '1-5,7' (default: 6)")
+    parser.add_argument('--stitch', action='store_true',
+                        help='merge each object\'s light curves across the selected sectors (each sector shifted to zero median) '
+                             'and write stitched_light_curves.npz instead of per-sector tables')
+    parser.add_argument('--root', default=root_directory,
+                        help='directory holding sectorNN/camX_ccdY/lc_hyperleda and plots/')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='number of worker processes shared by all sectors (default: 1, serial)')
+    parser.add_argument('--cache-dir', default=None,
+                        help='binary light curve cache directory (default: <root>/lc_cache, see LightCurveCache.py)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always parse the lc_*_cleaned text files')
+    parser.add_argument('--plots', choices=PLOT_MODES, default='immediate',
+                        help='render plots inside the object loop, queue them until the statistics are written, '
+                             'or skip them (default: immediate)')
+    parser.add_argument('--no-plots', dest='plots', action='store_const', const='off',
+                        help='statistics only, same as --plots off')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='serial runs only: read this many light curves ahead on I/O threads and write plots '
+                             'and manifest entries from a background thread (default: 0, off)')
+    parser.add_argument('--io-threads', type=int, default=4,
+                        help='threads reading light curves when --prefetch is set (default: 4)')
+    parser.add_argument('--render-workers', type=int, default=1,
+                        help='worker processes for rendering deferred plots (default: 1)')
+    parser.add_argument('--manifest', default='processed_light_curves.manifest.jsonl',
+                        help='per-object results manifest used to resume and skip unchanged objects')
+    parser.add_argument('--no-manifest', action='store_true',
+                        help='process every object and keep results in memory only')
+    parser.add_argument('--fresh', action='store_true',
+                        help='discard the existing manifest and reprocess every object')
+    parser.add_argument('--text-table', action='store_true',
+                        help='also export fixed-width processed_light_curves_sectorNN.txt tables')
+    parser.add_argument('--spool-dir', default=None,
+                        help='where finished results are spilled until the tables are written (default: system temp)')
+    parser.add_argument('--features', action='store_true',
+                        help='after the results tables, write Lomb-Scargle, excess variance and structure function '
+                             'features of every clipped light curve to variability_features.npz')
+    parser.add_argument('--trace', default=None,
+                        help='write per-object stage timings and a final summary as JSON lines to this path')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], default=None,
+                        help='profile the run (the parent process only when --workers > 1)')
+    parser.add_argument('--profile-output', default=None,
+                        help='cProfile stats file or pyinstrument HTML report')
+    return parser.parse_args()
 
-            for result in all_results:
-                row = "".join(f"{str(result.get(header, '')):<{max_widths[header] + 2}}" for header in headers)
-                file.write(row + "\n")
 
 if __name__ == "__main__":
-    main()
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    manifest_path = None if args.no_manifest else args.manifest
+    if args.fresh and manifest_path is not None and os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    cache_directory = None if args.no_cache else (args.cache_dir or os.path.join(args.root, 'lc_cache'))
+    with profiled(args.profile, args.profile_output):
+        main(workers=args.workers, cache_directory=cache_directory,
+             plot_mode=args.plots, render_workers=args.render_workers, manifest_path=manifest_path,
+             text_table=args.text_table, trace_path=args.trace, sectors=args.sectors, root=args.root,
+             stitch=args.stitch, prefetch=args.prefetch, io_threads=args.io_threads,
+             spool_directory=args.spool_dir, features=args.features)
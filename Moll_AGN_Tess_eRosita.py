@@ -1,75 +1,99 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from astropy.io import fits
 import glob
-from matplotlib.projections.geo import GeoAxes
+import argparse
 import pandas as pd
-
-agn_catalogs = [
-    'eFEDS_c001_hard_V6.2.fits.gz',
-    'eFEDS_c001_main_V6.2.fits.gz',
-    'etaCha_c001_hard_V1.fits.gz',
-    'etaCha_c001_main_V1.fits.gz'
-]
-
-ra_list = []
-dec_list = []
-
-for catalog in agn_catalogs:
-    with fits.open(catalog) as hdul:
-        data = hdul[1].data
-        ra_list.extend(data['RA'])
-        dec_list.extend(data['DEC'])
-
-ra_agn = np.array(ra_list)
-dec_agn = np.array(dec_list)
-
-objects = pd.read_csv('List.txt', header=None)[0].tolist()
-
-columns = ['Name', 'Objtype', 'Agnclass', 'RA', 'DEC', 'Mean_Flux', 'Stddev', 'Sector', 'Camera', 'CCD', 'Chi2_Normalized', 'Chi2_reduced_Normalized','Chi2_Standardized', 'Chi2_reduced_Standardized']
-
-light_curves = glob.glob('processed_light_curves*.txt')
-matched_ra = []
-matched_dec = []
-
-for curve_file in light_curves:
-    df = pd.read_csv(curve_file, delim_whitespace=True, names=columns)
-    matched_objects = df[df['Name'].isin(objects)]
-    matched_ra.extend(matched_objects['RA'].tolist())
-    matched_dec.extend(matched_objects['DEC'].tolist())
-
-matched_ra = np.array(matched_ra, dtype=float)
-matched_dec = np.array(matched_dec, dtype=float)
-
-l = np.zeros(len(ra_agn))
-b = np.zeros(len(ra_agn))
-
-for i in range(len(ra_agn)):
-    b[i] = dec_agn[i] * np.pi/180
-    if ra_agn[i] < 180:
-        l[i] = -(ra_agn[i] * np.pi/180)
-    else:
-        l[i] = 2*np.pi - (ra_agn[i] * np.pi/180)
-
-l_tess = np.zeros(len(matched_ra))
-b_tess = np.zeros(len(matched_ra))
-
-for i in range(len(matched_ra)):
-    b_tess[i] = matched_dec[i] * np.pi/180.0
-    if matched_ra[i] < 180:
-        l_tess[i] = -(matched_ra[i] * np.pi/180.0)
+from CatalogLoader import load_catalogs, erosita_catalogs
+from ResultsStore import read_results
+from PlotQueue import load_pyplot
+
+agn_catalogs = erosita_catalogs
+
+
+def mollweide_coordinates(ra, dec):
+    # RA/DEC in degrees -> (l, b) in radians as expected by the mollweide axes, RA increasing to the left.
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    b = dec * np.pi/180
+    l = np.where(ra < 180, -(ra * np.pi/180), 2*np.pi - (ra * np.pi/180))
+    return l, b
+
+
+def load_catalog_coordinates(catalogs):
+    columns = load_catalogs(catalogs, ('RA', 'DEC'))
+    return columns['RA'], columns['DEC']
+
+
+def load_matched_coordinates(light_curves, objects):
+    matched_ra = []
+    matched_dec = []
+    for curve_file in light_curves:
+        matched_objects = read_results(curve_file, columns=['Name', 'RA', 'DEC'], filters={'Name': objects})
+        matched_ra.append(matched_objects['RA'].to_numpy(dtype=float))
+        matched_dec.append(matched_objects['DEC'].to_numpy(dtype=float))
+    if not matched_ra:
+        return np.array([]), np.array([])
+    return np.concatenate(matched_ra), np.concatenate(matched_dec)
+
+
+def plot_density(ax, l, b, bins=(360, 180), cmap='Reds'):
+    # Binning in projected space keeps drawing cost tied to the grid size, not the number of sources.
+    from matplotlib.colors import LogNorm
+    lon_edges = np.linspace(-np.pi, np.pi, bins[0] + 1)
+    lat_edges = np.linspace(-np.pi/2, np.pi/2, bins[1] + 1)
+    counts, _, _ = np.histogram2d(l, b, bins=[lon_edges, lat_edges])
+    counts = np.ma.masked_equal(counts.T, 0)
+    if counts.count() == 0:
+        return None
+    return ax.pcolormesh(lon_edges, lat_edges, counts, cmap=cmap, norm=LogNorm(), shading='flat', rasterized=True)
+
+
+def plot_agn_map(catalogs=agn_catalogs, list_file='List.txt', light_curve_pattern='processed_light_curves*.npz',
+                 output='agn_map_mollweide.png', mode='scatter', bins=(360, 180), dpi=300):
+    ra_agn, dec_agn = load_catalog_coordinates(catalogs)
+
+    objects = pd.read_csv(list_file, header=None)[0].tolist()
+    matched_ra, matched_dec = load_matched_coordinates(glob.glob(light_curve_pattern), objects)
+
+    l, b = mollweide_coordinates(ra_agn, dec_agn)
+    l_tess, b_tess = mollweide_coordinates(matched_ra, matched_dec)
+
+    plt = load_pyplot()
+    fig = plt.figure(figsize=(16, 10))
+    ax = plt.subplot(111, projection='mollweide')
+    if mode == 'density':
+        mesh = plot_density(ax, l, b, bins)
+        if mesh is not None:
+            fig.colorbar(mesh, ax=ax, orientation='horizontal', pad=0.05, shrink=0.6, label='eRosita sources per bin')
     else:
-        l_tess[i] = 2*np.pi - (matched_ra[i] * np.pi/180.0)
-
-fig = plt.figure(figsize=(16, 10))
-ax = plt.subplot(111, projection='mollweide')
-ax.scatter(l, b, color='red', s=20, alpha=0.6, label='eRosita')
-ax.scatter(l_tess, b_tess, color='green', s=20, alpha=0.6, label='TESS')
-plt.grid(True)
-
-plt.legend(fontsize=15)
-plt.title('TESS vs eRosita', fontsize=20)
-plt.tight_layout(pad=0.9)
-
-plt.savefig('agn_map_mollweide.png', dpi=300, bbox_inches='tight')
-plt.close()
+        ax.scatter(l, b, color='red', s=20, alpha=0.6, label='eRosita')
+    ax.scatter(l_tess, b_tess, color='green', s=20, alpha=0.6, label='TESS')
+    plt.grid(True)
+
+    # loc='best' has to test every mesh cell, which dominates the density render time.
+    plt.legend(fontsize=15, loc='lower left' if mode == 'density' else 'best')
+    plt.title('TESS vs eRosita', fontsize=20)
+    plt.tight_layout(pad=0.9)
+
+    plt.savefig(output, dpi=dpi, bbox_inches='tight')
+    plt.close()
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mollweide sky map of eRosita sources and matched TESS AGN.')
+    parser.add_argument('catalogs', nargs='*', default=agn_catalogs, help='eRosita FITS catalogs')
+    parser.add_argument('--list-file', default='List.txt', help='object names to highlight')
+    parser.add_argument('--light-curves', default='processed_light_curves*.npz',
+                        help='glob for processed light curve result stores (or text tables)')
+    parser.add_argument('-o', '--output', default='agn_map_mollweide.png')
+    parser.add_argument('--mode', choices=['scatter', 'density'], default='scatter',
+                        help='draw every eRosita source, or a 2-D histogram in projected space')
+    parser.add_argument('--bins', type=int, nargs=2, default=[360, 180], metavar=('NLON', 'NLAT'))
+    parser.add_argument('--dpi', type=int, default=300)
+    args = parser.parse_args()
+
+    plot_agn_map(args.catalogs, args.list_file, args.light_curves, args.output, args.mode, tuple(args.bins), args.dpi)
+
+
+if __name__ == "__main__":
+    main()
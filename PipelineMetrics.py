@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import logging
+from contextlib import contextmanager
+
+OBJECT_STATUSES = ('ok', 'skipped', 'missing', 'failed', 'rejected')
+
+
+class ObjectTrace:
+    # Stage timings for one object. Built inside whichever process handles the object and shipped
+    # back to the parent as a plain dict.
+    def __init__(self, unit_id, name):
+        self.record = {'unit': unit_id, 'name': str(name), 'status': 'ok', 'stages': {}, 'bytes_read': 0,
+                       'pid': os.getpid()}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        stages = self.record['stages']
+        stages[name] = stages.get(name, 0.0) + seconds
+
+    def move(self, source, target, seconds):
+        # Re-attribute time measured inside an enclosing stage (e.g. savefig inside statistics).
+        if seconds > 0:
+            self.add(source, -seconds)
+            self.add(target, seconds)
+
+    def set_status(self, status):
+        self.record['status'] = status
+
+    def add_bytes(self, n_bytes):
+        self.record['bytes_read'] += n_bytes
+
+
+class PipelineMetrics:
+    def __init__(self, trace_path=None):
+        self.trace_path = trace_path
+        self.started = time.perf_counter()
+        self.stage_totals = {}
+        self.stage_max = {}
+        self.status_counts = {status: 0 for status in OBJECT_STATUSES}
+        self.bytes_read = 0
+        self.objects = 0
+        self._trace_file = open(trace_path, 'w') if trace_path else None
+
+    def record(self, trace):
+        self.objects += 1
+        self.status_counts[trace['status']] = self.status_counts.get(trace['status'], 0) + 1
+        self.bytes_read += trace['bytes_read']
+        for stage, seconds in trace['stages'].items():
+            self.stage_totals[stage] = self.stage_totals.get(stage, 0.0) + seconds
+            self.stage_max[stage] = max(self.stage_max.get(stage, 0.0), seconds)
+        if self._trace_file is not None:
+            self._trace_file.write(json.dumps(trace) + "\n")
+
+    def add_stage(self, stage, seconds):
+        # Run-level stages that don't belong to one object (catalog loading, writing, rendering).
+        self.stage_totals[stage] = self.stage_totals.get(stage, 0.0) + seconds
+        self.stage_max[stage] = max(self.stage_max.get(stage, 0.0), seconds)
+
+    @contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(stage, time.perf_counter() - start)
+
+    def summary(self):
+        return {
+            'wall_seconds': time.perf_counter() - self.started,
+            'objects': self.objects,
+            'statuses': self.status_counts,
+            'bytes_read': self.bytes_read,
+            'stages': {stage: {'total_seconds': total, 'max_seconds': self.stage_max[stage]}
+                       for stage, total in sorted(self.stage_totals.items(), key=lambda item: -item[1])},
+        }
+
+    def close(self):
+        summary = self.summary()
+        if self._trace_file is not None:
+            self._trace_file.write(json.dumps({'summary': summary}) + "\n")
+            self._trace_file.close()
+            self._trace_file = None
+
+        logging.info(f"Run summary: {summary['objects']} objects in {summary['wall_seconds']:.1f} s, "
+                     f"{summary['bytes_read'] / 1e6:.1f} MB read, statuses {summary['statuses']}")
+        for stage, values in summary['stages'].items():
+            logging.info(f"  {stage:<20} {values['total_seconds']:10.3f} s total, {values['max_seconds']:8.3f} s max")
+        return summary
+
+
+@contextmanager
+def profiled(profiler=None, output_path=None):
+    if profiler is None:
+        yield
+        return
+
+    if profiler == 'cprofile':
+        import cProfile
+        import pstats
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            if output_path:
+                profile.dump_stats(output_path)
+                logging.info(f"cProfile stats written to {output_path}")
+            pstats.Stats(profile).sort_stats('cumulative').print_stats(25)
+    elif profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logging.error("pyinstrument is not installed; running without profiling")
+            yield
+            return
+
+        profile = Profiler()
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            if output_path:
+                with open(output_path, 'w') as f:
+                    f.write(profile.output_html())
+                logging.info(f"pyinstrument report written to {output_path}")
+            print(profile.output_text(unicode=True, color=False))
+    else:
+        raise ValueError(f"Unknown profiler {profiler!r}")
@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import pickle
+import logging
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Plot specs are plain dicts of arrays and labels, so they can be pickled to render workers and
+# matplotlib is only imported by the process that actually draws them.
+PLOT_MODES = ('immediate', 'deferred', 'off')
+
+
+def load_pyplot():
+    # Everything here draws straight to files, so the headless Agg backend is selected before pyplot
+    # is first imported; that also skips probing for a GUI toolkit in pool workers. When pyplot is
+    # already loaded (a notebook, an interactive session) its backend and open figures are left alone.
+    if 'matplotlib.pyplot' not in sys.modules:
+        import matplotlib
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def render_histogram(spec):
+    from scipy import stats
+    plt = load_pyplot()
+
+    data = spec['data']
+    plt.figure(figsize=(10, 6))
+    plt.hist(data, bins=spec['num_bins'], density=True, alpha=0.7)
+
+    x = np.linspace(np.min(data), np.max(data), 100)
+    gaussian = stats.norm.pdf(x, spec['mu'], spec['sigma'])
+    plt.plot(x, gaussian, 'r-', lw=2, label='Gaussian fit')
+
+    plt.title(spec['title'])
+    plt.xlabel("Value")
+    plt.ylabel("Frequency")
+    plt.legend()
+    plt.savefig(spec['save_path'])
+    plt.close()
+
+
+def render_light_curve(spec):
+    plt = load_pyplot()
+
+    plt.figure(figsize=(10, 6))
+    plt.errorbar(spec['btjd'], spec['cts'], yerr=spec['e_cts'], fmt='o', color='blue', ecolor='lightgray', elinewidth=3, capsize=0)
+    plt.title(spec['title'])
+    plt.xlabel('BTJD (Barycentric TESS Julian Date)')
+    plt.ylabel('Counts (cts)')
+    plt.grid(True)
+    plt.savefig(spec['save_path'])
+    plt.close()
+    logging.info(f"Light Curve saved to {spec['save_path']}")
+
+
+renderers = {
+    'histogram': render_histogram,
+    'light_curve': render_light_curve,
+}
+
+
+def render_spec(spec):
+    try:
+        renderers[spec['kind']](spec)
+        return True
+    except Exception as e:
+        logging.error(f"An error occurred while plotting {spec.get('title')}: {e}")
+        return False
+
+
+def _batches(specs, size):
+    batch = []
+    for spec in specs:
+        batch.append(spec)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def render_specs(specs, workers=1):
+    # specs may be a list or a PlotSpool; the pool is fed in bounded batches so a spooled queue is
+    # never read back into memory all at once.
+    if not specs:
+        return 0
+    logging.info(f"Rendering {len(specs)} queued plots with {workers} worker(s)")
+    if workers <= 1:
+        return sum(render_spec(spec) for spec in specs)
+    chunksize = max(1, min(len(specs) // (workers * 8), 32))
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch in _batches(specs, workers * chunksize * 4):
+            rendered += sum(executor.map(render_spec, batch, chunksize=chunksize))
+    return rendered
+
+
+class PlotSpool:
+    # Deferred plot specs pickled to a temporary file as they arrive, so the arrays of every queued
+    # light curve and histogram aren't held in memory until the tables are written.
+    def __init__(self, directory=None):
+        self._tmp = tempfile.TemporaryDirectory(prefix='plot_spool_', dir=directory)
+        self.path = os.path.join(self._tmp.name, 'specs.pickle')
+        self._file = open(self.path, 'wb')
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def extend(self, specs):
+        for spec in specs:
+            pickle.dump(spec, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.count += 1
+
+    def __iter__(self):
+        self._file.flush()
+        with open(self.path, 'rb') as f:
+            for _ in range(self.count):
+                yield pickle.load(f)
+
+    def close(self):
+        self._file.close()
+        self._tmp.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PlotQueue:
+    def __init__(self, mode='immediate'):
+        if mode not in PLOT_MODES:
+            raise ValueError(f"Unknown plot mode {mode!r}, expected one of {PLOT_MODES}")
+        self.mode = mode
+        self.specs = []
+        self.render_seconds = 0.0
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def submit(self, spec):
+        if self.mode == 'immediate':
+            start = time.perf_counter()
+            render_spec(spec)
+            self.render_seconds += time.perf_counter() - start
+        elif self.mode == 'deferred':
+            spec['save_path'] = os.path.abspath(spec['save_path'])
+            self.specs.append(spec)
+
+    def drain(self):
+        specs, self.specs = self.specs, []
+        return specs
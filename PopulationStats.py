@@ -0,0 +1,200 @@
+import glob
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from ResultsStore import read_results
+from LightCurve2 import pack_light_curves
+
+# Test 1 (Normalized) is taken about the object's own ML mu/sigma, so its chi2 is exactly n by
+# construction and carries no significance; it isn't turned into a p-value or offered for ranking.
+# Test 2 (Standardized) fits no parameters, so it has n degrees of freedom, but it only tests
+# cts != 0, not variability. Only the Variability test (needs the light curves) writes List.txt.
+chi2_tests = ('Standardized',)
+ranking_tests = ('Standardized', 'Variability')
+identity_columns = ['Name', 'Objtype', 'Agnclass', 'RA', 'DEC', 'Sector', 'Camera', 'CCD']
+
+
+def _valid_points(values, lengths):
+    return (np.arange(values.shape[1]) < np.asarray(lengths)[:, None]) & np.isfinite(values)
+
+
+def gaussian_fit_batch(values, lengths):
+    # stats.norm.fit for every row of a padded (n_objects, width) array: mean and the ddof=0 std
+    # over each row's first lengths[i] finite values.
+    values = np.asarray(values, dtype=np.float64)
+    valid = _valid_points(values, lengths)
+    n = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mu = np.where(valid, values, 0).sum(axis=1) / n
+        deviation = np.where(valid, values - mu[:, None], 0)
+        sigma = np.sqrt(np.einsum('ij,ij->i', deviation, deviation) / n)
+    return mu, sigma, n
+
+
+def variability_chi2_batch(cts, e_cts, lengths):
+    # chi2 of each light curve about its inverse-variance weighted mean, with n - 1 degrees of freedom
+    # counted per object over the points that have a finite flux and a positive finite error.
+    cts = np.asarray(cts, dtype=np.float64)
+    e_cts = np.asarray(e_cts, dtype=np.float64)
+    valid = _valid_points(cts, lengths) & np.isfinite(e_cts) & (e_cts > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weights = np.where(valid, 1 / np.where(valid, e_cts, 1) ** 2, 0)
+        flux = np.where(valid, cts, 0)
+        weighted_mean = np.einsum('ij,ij->i', weights, flux) / weights.sum(axis=1)
+        residual = flux - weighted_mean[:, None]
+        chi2 = np.einsum('ij,ij,ij->i', weights, residual, residual)
+    dof = valid.sum(axis=1) - 1.0
+    dof[dof <= 0] = np.nan
+    return chi2, dof
+
+
+def chi2_pvalues(chi2, dof):
+    # Survival probability and its log10; logsf keeps the ranking meaningful where sf underflows to 0.
+    from scipy import stats
+    chi2 = np.asarray(chi2, dtype=np.float64)
+    dof = np.asarray(dof, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return stats.chi2.sf(chi2, dof), stats.chi2.logsf(chi2, dof) / np.log(10)
+
+
+def population_from_results(data):
+    # p-values of the per-object chi2 tests in a results table. The pipeline reduces every chi2 by
+    # n - 1, so chi2 / reduced chi2 + 1 recovers the number of points, which is the Standardized dof.
+    population = data[[name for name in identity_columns if name in data.columns]].copy()
+    if 'Chi2_reduced_Normalized' in data.columns:
+        population['Chi2_reduced_Normalized'] = data['Chi2_reduced_Normalized'].to_numpy(dtype=np.float64)
+    for test in chi2_tests:
+        chi2 = data[f'Chi2_{test}'].to_numpy(dtype=np.float64)
+        reduced = data[f'Chi2_reduced_{test}'].to_numpy(dtype=np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            dof = np.rint(chi2 / reduced) + 1
+        dof[~np.isfinite(dof) | (dof <= 0)] = np.nan
+        p_value, log_p = chi2_pvalues(chi2, dof)
+        population[f'Chi2_reduced_{test}'] = reduced
+        population[f'Dof_{test}'] = dof
+        population[f'P_{test}'] = p_value
+        population[f'Log10P_{test}'] = log_p
+    return population
+
+
+def population_from_light_curves(curves):
+    # Gaussian fit of cts and variability chi2 for a list of (clipped) light curve frames, in one
+    # padded-array pass. Missing curves (None) get NaN rows.
+    present = [i for i, curve in enumerate(curves) if curve is not None and len(curve) > 0]
+    columns = {name: np.full(len(curves), np.nan) for name in
+               ('N_Points', 'Mu_Flux', 'Sigma_Flux', 'Chi2_Variability', 'Chi2_reduced_Variability',
+                'Dof_Variability', 'P_Variability', 'Log10P_Variability')}
+    if present:
+        cts, lengths = pack_light_curves([curves[i] for i in present], 'cts')
+        e_cts, _ = pack_light_curves([curves[i] for i in present], 'e_cts')
+        mu, sigma, n = gaussian_fit_batch(cts, lengths)
+        chi2, dof = variability_chi2_batch(cts, e_cts, lengths)
+        p_value, log_p = chi2_pvalues(chi2, dof)
+        for name, values in (('N_Points', n), ('Mu_Flux', mu), ('Sigma_Flux', sigma), ('Chi2_Variability', chi2),
+                             ('Chi2_reduced_Variability', chi2 / dof), ('Dof_Variability', dof),
+                             ('P_Variability', p_value), ('Log10P_Variability', log_p)):
+            columns[name][present] = values
+    return pd.DataFrame(columns)
+
+
+def add_light_curve_statistics(population, repository, block_size=1000):
+    # Pulls each row's clipped light curve from a LightCurveRepository, block by block so only
+    # block_size curves are packed at a time.
+    blocks = []
+    for start in range(0, len(population), block_size):
+        rows = population.iloc[start:start + block_size]
+        curves = []
+        for name, sector, cam, ccd in zip(rows['Name'], rows['Sector'], rows['Camera'], rows['CCD']):
+            try:
+                curves.append(repository.clipped(name, sector, cam, ccd))
+            except (KeyError, ValueError) as e:
+                logging.warning(f"No single light curve for {name} in sector {sector}: {e}")
+                curves.append(None)
+        blocks.append(population_from_light_curves(curves))
+    statistics = pd.concat(blocks, ignore_index=True) if blocks else population_from_light_curves([])
+    return pd.concat([population.reset_index(drop=True), statistics], axis=1)
+
+
+def rank_candidates(population, test='Standardized', alpha=1e-3):
+    # Most significant first (lowest log10 p, ties broken by the larger reduced chi2). Candidates pass
+    # alpha after a Bonferroni correction over the objects with a usable p-value.
+    log_p = population[f'Log10P_{test}']
+    tie_break = population[f'Chi2_reduced_{test}']
+    ranked = population.assign(_log_p=log_p.fillna(np.inf), _tie=-tie_break.fillna(-np.inf))
+    ranked = ranked.sort_values(['_log_p', '_tie'], kind='stable').drop(columns=['_log_p', '_tie'])
+    ranked = ranked.reset_index(drop=True)
+
+    tested = int(np.isfinite(log_p).sum())
+    threshold = np.log10(alpha / max(tested, 1))
+    ranked.insert(0, 'Rank', np.arange(1, len(ranked) + 1))
+    ranked['Candidate'] = ranked[f'Log10P_{test}'] < threshold
+    return ranked
+
+
+def write_candidate_list(ranked, output_file='List.txt', top=None):
+    # One name per line in rank order, the format eRosita_Interesting_AGN.py reads.
+    names = pd.unique(ranked.loc[ranked['Candidate'], 'Name'].astype(str))
+    if top is not None:
+        names = names[:top]
+    with open(output_file, 'w') as f:
+        for name in names:
+            f.write(f"{name}\n")
+    return len(names)
+
+
+def load_population(pattern='processed_light_curves*.npz'):
+    files = sorted(glob.glob(pattern))
+    if not files:
+        return files, None
+    return files, pd.concat([read_results(path) for path in files], ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank processed light curves by chi2 significance across the population.')
+    parser.add_argument('pattern', nargs='?', default='processed_light_curves*.npz',
+                        help='glob for result stores or text tables (default: processed_light_curves*.npz)')
+    parser.add_argument('--test', choices=ranking_tests, default=None,
+                        help='chi2 test to rank by (default: Variability with --root, else Standardized). '
+                             'Only the Variability ranking is written to the candidate list')
+    parser.add_argument('--alpha', type=float, default=1e-3,
+                        help='family-wise significance level, Bonferroni corrected (default: 1e-3)')
+    parser.add_argument('--top', type=int, default=None, help='keep at most this many candidates')
+    parser.add_argument('--root', default=None,
+                        help='light curve root (sectorNN/camX_ccdY/lc_hyperleda); adds the variability chi2 '
+                             'about the weighted mean computed from the clipped light curves')
+    parser.add_argument('--cache-dir', default=None, help='binary light curve cache used with --root')
+    parser.add_argument('--list', default='List.txt', help='candidate name list (default: List.txt)')
+    parser.add_argument('--table', default='variability_ranking.tsv', help='full ranked table (default: variability_ranking.tsv)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    files, data = load_population(args.pattern)
+    if data is None:
+        logging.error(f"No results tables match {args.pattern}")
+        return
+    logging.info(f"Read {len(data)} objects from {len(files)} tables")
+
+    population = population_from_results(data)
+    test = args.test or ('Variability' if args.root else 'Standardized')
+    if args.root is not None:
+        from LightCurveRepository import LightCurveRepository
+        repository = LightCurveRepository(args.root, cache_directory=args.cache_dir)
+        population = add_light_curve_statistics(population, repository)
+    elif test == 'Variability':
+        parser.error('--test Variability needs --root')
+
+    ranked = rank_candidates(population, test, args.alpha)
+    ranked.to_csv(args.table, index=False, sep='\t', float_format='%.6e', na_rep='NaN')
+    logging.info(f"{int(ranked['Candidate'].sum())} rows pass alpha={args.alpha} on the {test} test; "
+                 f"wrote the ranking to {args.table}")
+    if test != 'Variability':
+        # Standardized only tests cts != 0, so nearly every object passes; keep the curated list.
+        logging.warning(f"Not writing {args.list}: candidates need the Variability test (--root)")
+        return
+    written = write_candidate_list(ranked, args.list, args.top)
+    logging.info(f"Wrote {written} names to {args.list}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+import logging
+
+
+def file_hash(file_path):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def object_key(obj_name, lc_file_path, params):
+    # lc_file_path may also be a list of paths (a stitched multi-sector object).
+    if isinstance(lc_file_path, (str, os.PathLike)):
+        lc = file_hash(lc_file_path)
+    else:
+        lc = [file_hash(path) for path in lc_file_path]
+    payload = json.dumps({'name': str(obj_name), 'lc': lc, 'params': params}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _to_json(value):
+    # numpy scalars (np.int64, np.bool_) aren't JSON serialisable; float64/str_ already are.
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ResultsManifest:
+    # JSON-lines record of every finished object, appended as the run goes so it survives crashes.
+    # The latest line for a unit id wins; a null result means the object was processed but rejected.
+    # Only {unit: (key, byte offset of its latest line)} is held in memory; results are read back
+    # from the file when they are needed.
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+
+    def load(self):
+        self.entries = {}
+        if not os.path.exists(self.path):
+            return self.entries
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line_number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping truncated manifest line {line_number} in {self.path}")
+                else:
+                    self.entries[entry['unit']] = (entry['key'], offset)
+                offset += len(line)
+        logging.info(f"Loaded {len(self.entries)} entries from manifest {self.path}")
+        return self.entries
+
+    def key_for(self, unit_id):
+        entry = self.entries.get(unit_id)
+        return entry[0] if entry else None
+
+    def result_for(self, unit_id):
+        return next(self.iter_results([unit_id]))
+
+    def iter_results(self, unit_ids):
+        # Stored result (or None) for each unit id, in the given order, read from the file one line at a time.
+        with open(self.path, 'rb') as f:
+            for unit_id in unit_ids:
+                entry = self.entries.get(unit_id)
+                if entry is None:
+                    yield None
+                    continue
+                f.seek(entry[1])
+                yield json.loads(f.readline())['result']
+
+    def append(self, unit_id, key, result):
+        line = (json.dumps({'unit': unit_id, 'key': key, 'result': result}, default=_to_json) + "\n").encode()
+        with open(self.path, 'ab') as f:
+            f.seek(0, os.SEEK_END)
+            self.entries[unit_id] = (key, f.tell())
+            f.write(line)
+            f.flush()
+
+    def discard(self, unit_id):
+        # Dropped from memory only; the next compact() rewrites the file without it.
+        self.entries.pop(unit_id, None)
+
+    def compact(self):
+        # Copies each unit's latest line into a fresh file, streaming, and points the offsets at it.
+        tmp_path = self.path + '.tmp'
+        entries = {}
+        with open(tmp_path, 'wb') as out:
+            if os.path.exists(self.path):
+                with open(self.path, 'rb') as f:
+                    for unit_id, (key, offset) in self.entries.items():
+                        f.seek(offset)
+                        entries[unit_id] = (key, out.tell())
+                        out.write(f.readline())
+        os.replace(tmp_path, self.path)
+        self.entries = entries
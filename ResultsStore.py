@@ -0,0 +1,275 @@
+import os
+import json
+import zipfile
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Column order and types of the processed light curve results. Text fields keep their exact
+# spelling (Sector '06' stays '06'), numeric fields are float64.
+results_schema = [
+    ('Name', 'str'),
+    ('Objtype', 'str'),
+    ('Agnclass', 'str'),
+    ('RA', 'float64'),
+    ('DEC', 'float64'),
+    ('Mean_Flux', 'float64'),
+    ('Stddev', 'float64'),
+    ('Sector', 'str'),
+    ('Camera', 'str'),
+    ('CCD', 'str'),
+    ('Chi2_Normalized', 'float64'),
+    ('Chi2_reduced_Normalized', 'float64'),
+    ('Chi2_Standardized', 'float64'),
+    ('Chi2_reduced_Standardized', 'float64'),
+]
+schema_version = 1
+# Text columns with a handful of distinct values; ResultsSpool stores them as integer codes.
+categorical_columns = ('Objtype', 'Agnclass', 'Sector', 'Camera', 'CCD')
+
+
+def _column_array(values, kind):
+    if kind == 'str':
+        return np.array([str(value) for value in values], dtype=str)
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def write_results_store(results, output_file):
+    columns = {name: _column_array([result.get(name) for result in results], kind) for name, kind in results_schema}
+    schema = json.dumps({'version': schema_version, 'columns': results_schema, 'rows': len(results)})
+    with open(output_file, 'wb') as f:
+        np.savez(f, __schema__=np.array(schema), **columns)
+    return output_file
+
+
+def _filter_mask(get_column, n_rows, filters):
+    mask = np.ones(n_rows, dtype=bool)
+    for name, wanted in (filters or {}).items():
+        values = get_column(name)
+        if isinstance(wanted, (str, bytes)) or np.isscalar(wanted):
+            mask &= values == wanted
+        else:
+            mask &= np.isin(values, list(wanted))
+    return mask
+
+
+def read_results_store(path, columns=None, filters=None):
+    # Filter columns (e.g. Name/Agnclass/Sector) are loaded and evaluated first; only the requested
+    # columns are then read from the archive, already restricted to the matching rows.
+    with np.load(path, allow_pickle=False) as archive:
+        schema = json.loads(str(archive['__schema__']))
+        names = [name for name, _ in schema['columns']]
+        columns = names if columns is None else [name for name in columns if name in names]
+
+        loaded = {}
+
+        def get_column(name):
+            if name not in loaded:
+                loaded[name] = archive[name]
+            return loaded[name]
+
+        mask = _filter_mask(get_column, schema['rows'], filters)
+        return pd.DataFrame({name: get_column(name)[mask] for name in columns}, columns=columns)
+
+
+def read_text_table(path, columns=None, filters=None):
+    usecols = None
+    if columns is not None:
+        wanted = set(columns) | set(filters or {})
+        usecols = lambda column: column in wanted
+    data = pd.read_csv(path, sep=r'\s+', usecols=usecols, dtype={'Sector': str, 'Camera': str, 'CCD': str})
+    mask = _filter_mask(lambda name: data[name].values, len(data), filters)
+    data = data[mask].reset_index(drop=True)
+    return data if columns is None else data[[name for name in columns if name in data.columns]]
+
+
+def read_results(path, columns=None, filters=None):
+    if str(path).endswith('.npz'):
+        return read_results_store(path, columns, filters)
+    return read_text_table(path, columns, filters)
+
+
+def _write_npy_member(archive, name, dtype, n_rows, blocks):
+    # One .npy member of an .npz written block by block, so the full column never sits in memory.
+    header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (n_rows,)}
+    with archive.open(f"{name}.npy", 'w', force_zip64=True) as f:
+        np.lib.format.write_array_header_2_0(f, header)
+        for block in blocks:
+            f.write(np.ascontiguousarray(block, dtype=dtype).tobytes())
+
+
+class ResultsView:
+    # Re-iterable sequence of result dicts for a row selection, read back from the spool on every pass.
+    def __init__(self, spool, rows):
+        self.spool = spool
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return self.spool.iter_results(self.rows)
+
+
+class ResultsSpool:
+    # Compact, disk-backed accumulator for per-object results. Each row is packed into a fixed
+    # record (float64 numbers, uint32 codes for the categorical text columns) and every chunk_rows
+    # rows the records and the remaining per-row text (Name) are spilled to .npy files, so memory
+    # does not grow with the number of objects. Rows can arrive in any order; position sets the
+    # output order.
+    def __init__(self, directory=None, chunk_rows=8192, block_rows=65536):
+        self._tmp = tempfile.TemporaryDirectory(prefix='results_spool_', dir=directory)
+        self.directory = self._tmp.name
+        self.chunk_rows = chunk_rows
+        self.block_rows = block_rows
+        self.text_columns = [name for name, kind in results_schema if kind == 'str' and name not in categorical_columns]
+        self.dtype = np.dtype([('position', '<i8')] + [
+            (name, '<u4' if name in categorical_columns else '<f8')
+            for name, kind in results_schema if name not in self.text_columns])
+        self.codes = {name: {} for name in categorical_columns}
+        self.labels = {name: [] for name in categorical_columns}
+        self.chunks = []
+        self.offsets = [0]
+        self._buffer = np.zeros(chunk_rows, dtype=self.dtype)
+        self._text = {name: [] for name in self.text_columns}
+        self._filled = 0
+        self._order = None
+        self._mapped = {}
+
+    def __len__(self):
+        return self.offsets[-1] + self._filled
+
+    def _code(self, name, value):
+        codes = self.codes[name]
+        if value not in codes:
+            codes[value] = len(self.labels[name])
+            self.labels[name].append(value)
+        return codes[value]
+
+    def append(self, result, position=None):
+        if self._order is not None:
+            raise RuntimeError("ResultsSpool is already finished")
+        record = self._buffer[self._filled]
+        record['position'] = len(self) if position is None else position
+        for name, kind in results_schema:
+            value = result.get(name)
+            if name in self.text_columns:
+                self._text[name].append(str(value))
+            elif name in categorical_columns:
+                record[name] = self._code(name, str(value))
+            else:
+                record[name] = np.nan if value is None else value
+        self._filled += 1
+        if self._filled == self.chunk_rows:
+            self._flush()
+
+    def _flush(self):
+        if self._filled == 0:
+            return
+        number = len(self.chunks)
+        paths = {'records': os.path.join(self.directory, f"records_{number}.npy")}
+        np.save(paths['records'], self._buffer[:self._filled])
+        for name, values in self._text.items():
+            paths[name] = os.path.join(self.directory, f"{name}_{number}.npy")
+            np.save(paths[name], np.array(values, dtype=str))
+            values.clear()
+        self.chunks.append(paths)
+        self.offsets.append(self.offsets[-1] + self._filled)
+        self._filled = 0
+
+    def finish(self):
+        # Spills the last partial chunk and fixes the output order; no rows can be added afterwards.
+        if self._order is None:
+            self._flush()
+            positions = np.concatenate([self._chunk(number, 'records')['position'] for number in range(len(self.chunks))]) \
+                if self.chunks else np.array([], dtype=np.int64)
+            self._order = np.argsort(positions, kind='stable')
+        return self
+
+    def _chunk(self, number, part):
+        key = (number, part)
+        if key not in self._mapped:
+            self._mapped[key] = np.load(self.chunks[number][part], mmap_mode='r')
+        return self._mapped[key]
+
+    def _gather(self, name, rows):
+        # Decoded values of one column for the given global row ids.
+        rows = np.asarray(rows, dtype=np.int64)
+        chunk_numbers = np.searchsorted(self.offsets, rows, side='right') - 1
+        local = rows - np.asarray(self.offsets)[chunk_numbers]
+        part = name if name in self.text_columns else 'records'
+        values = None
+        for number in np.unique(chunk_numbers):
+            selected = chunk_numbers == number
+            chunk = self._chunk(number, part)
+            chunk_values = chunk[local[selected]] if part != 'records' else chunk[name][local[selected]]
+            if values is None:
+                values = np.empty(len(rows), dtype=chunk_values.dtype if part == 'records' else object)
+            values[selected] = chunk_values
+        if values is None:
+            values = np.array([], dtype=object if part != 'records' else self.dtype[name])
+        if name in categorical_columns:
+            return np.array(self.labels[name], dtype=object)[values] if len(values) else values.astype(object)
+        return values
+
+    def _blocks(self, rows):
+        for start in range(0, len(rows), self.block_rows):
+            yield rows[start:start + self.block_rows]
+
+    def rows(self, filters=None):
+        # Global row ids in output order, optionally restricted by exact-match filters.
+        self.finish()
+        rows = self._order
+        for name, wanted in (filters or {}).items():
+            keep = [self._filter_mask(name, block, wanted) for block in self._blocks(rows)]
+            rows = rows[np.concatenate(keep)] if keep else rows
+        return rows
+
+    def _filter_mask(self, name, rows, wanted):
+        values = self._gather(name, rows)
+        if isinstance(wanted, (str, bytes)) or np.isscalar(wanted):
+            return values == wanted
+        return np.isin(values, list(wanted))
+
+    def iter_results(self, rows=None):
+        rows = self.rows() if rows is None else rows
+        names = [name for name, _ in results_schema]
+        for block in self._blocks(rows):
+            columns = [self._gather(name, block) for name in names]
+            for values in zip(*columns):
+                yield {name: (str(value) if kind == 'str' else value)
+                       for (name, kind), value in zip(results_schema, values)}
+
+    def view(self, rows=None):
+        return ResultsView(self, self.rows() if rows is None else rows)
+
+    def write_store(self, output_file, rows=None):
+        # Same archive as write_results_store, streamed column by column in blocks.
+        rows = self.rows() if rows is None else rows
+        schema = json.dumps({'version': schema_version, 'columns': results_schema, 'rows': len(rows)})
+        tmp_path = output_file + '.tmp'
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+            with archive.open('__schema__.npy', 'w') as f:
+                np.lib.format.write_array(f, np.array(schema), allow_pickle=False)
+            for name, kind in results_schema:
+                if kind == 'str':
+                    width = max([1] + [int(np.char.str_len(self._gather(name, block).astype(str)).max())
+                                       for block in self._blocks(rows) if len(block)])
+                    dtype = np.dtype(f'<U{width}')
+                    blocks = (self._gather(name, block).astype(str) for block in self._blocks(rows))
+                else:
+                    dtype = np.dtype(np.float64)
+                    blocks = (self._gather(name, block) for block in self._blocks(rows))
+                _write_npy_member(archive, name, dtype, len(rows), blocks)
+        os.replace(tmp_path, output_file)
+        return output_file
+
+    def close(self):
+        self._mapped.clear()
+        self._tmp.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
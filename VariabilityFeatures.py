@@ -0,0 +1,284 @@
+import logging
+import argparse
+import functools
+import numpy as np
+import pandas as pd
+from LightCurve2 import pack_light_curves
+
+feature_columns = ['N_Points', 'LS_Peak_Frequency', 'LS_Peak_Period', 'LS_Peak_Power', 'LS_FAP',
+                   'Excess_Variance_Abs', 'Excess_Variance', 'Excess_Variance_Err', 'F_Var', 'SF_Slope']
+
+
+@functools.lru_cache(maxsize=16)
+def frequency_grid(baseline_days, max_frequency=2.0, oversample=5):
+    # Uniform grid in cycles/day from 1/baseline up to max_frequency, oversampled relative to the
+    # 1/baseline resolution. Cached so every block of a sector shares the same (read-only) grid.
+    df = 1 / (oversample * baseline_days)
+    frequencies = np.arange(1 / baseline_days, max_frequency + df / 2, df)
+    frequencies.setflags(write=False)
+    return frequencies
+
+
+def pack_curves(curves):
+    # Padded (n_objects, width) BTJD/cts/e_cts arrays plus the mask of usable points.
+    t, lengths = pack_light_curves(curves, 'BTJD')
+    y, _ = pack_light_curves(curves, 'cts')
+    dy, _ = pack_light_curves(curves, 'e_cts')
+    valid = (np.arange(t.shape[1]) < lengths[:, None]) & np.isfinite(t) & np.isfinite(y) & np.isfinite(dy) & (dy > 0)
+    return t, y, dy, valid
+
+
+def _extirpolate_batch(x, values, valid, n_grid, order=4):
+    # Press & Rybicki (1989) extirpolation of every row's (x, value) points onto n_grid integer
+    # nodes, so that sums of value * exp(2 pi i k x / n_grid) can be taken with one FFT per row.
+    n_objects = len(x)
+    rows = np.nonzero(valid)[0]
+    x = x[valid]
+    values = values[valid]
+    result = np.zeros(n_objects * n_grid, dtype=np.complex128)
+
+    def add(rows, index, contribution):
+        flat = rows * n_grid + index
+        result.real += np.bincount(flat, contribution.real, minlength=len(result))
+        result.imag += np.bincount(flat, contribution.imag, minlength=len(result))
+
+    on_node = x % 1 == 0
+    add(rows[on_node], x[on_node].astype(np.intp), values[on_node])
+    rows, x, values = rows[~on_node], x[~on_node], values[~on_node]
+
+    low = np.clip((x - order // 2).astype(np.intp), 0, n_grid - order)
+    numerator = values * np.prod(x - low - np.arange(order)[:, None], axis=0)
+    denominator = float(np.prod(np.arange(1, order)))
+    for j in range(order):
+        if j > 0:
+            denominator *= j / (j - order)
+        index = low + (order - 1 - j)
+        add(rows, index, numerator / (denominator * (x - index)))
+    return result.reshape(n_objects, n_grid)
+
+
+def _trig_sums_fft(tt, weights, valid, frequencies, oversampling=5):
+    # sum_j weights_j * exp(2 pi i f_k tt_j) for every row and every (uniform) frequency f_k.
+    f0, df, n = frequencies[0], frequencies[1] - frequencies[0], len(frequencies)
+    n_grid = 1 << int(np.ceil(np.log2(n * oversampling)))
+    shifted = weights * np.exp(2j * np.pi * f0 * tt)
+    grid = _extirpolate_batch((tt * df) % 1 * n_grid, shifted, valid, n_grid)
+    return n_grid * np.fft.ifft(grid, axis=1)[:, :n]
+
+
+def _trig_sums_direct(tt, weights, frequencies, anchor_every=64):
+    # The same sums evaluated point by point; exp(i theta) at the next frequency comes from
+    # multiplying by a fixed per-point step and is re-anchored exactly every anchor_every steps.
+    sums = np.empty((len(tt), len(frequencies)), dtype=np.complex128)
+    step = np.exp(2j * np.pi * (frequencies[1] - frequencies[0]) * tt)
+    for k, frequency in enumerate(frequencies):
+        if k % anchor_every == 0:
+            z = np.exp(2j * np.pi * frequency * tt)
+        else:
+            z *= step
+        sums[:, k] = np.einsum('ij,ij->i', weights, z)
+    return sums
+
+
+def lomb_scargle_batch(t, y, dy, valid, frequencies, method='fast'):
+    # Generalised (floating-mean, error-weighted) Lomb-Scargle power, Zechmeister & Kuerster (2009),
+    # for every row at once on a shared uniform frequency grid. 'fast' takes the trigonometric sums
+    # by extirpolation and FFT (as astropy's fast method does), 'direct' sums over the points.
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    n_objects = len(t)
+    if n_objects == 0 or len(frequencies) < 2:
+        return np.full((n_objects, len(frequencies)), np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(valid, 1 / np.where(valid, dy, 1) ** 2, 0)
+        w /= w.sum(axis=1, keepdims=True)
+        # Power doesn't depend on the time origin; starting each row at 0 keeps the phases small.
+        t0 = np.nanmin(np.where(valid, t, np.nan), axis=1)
+        tt = np.where(valid, t - t0[:, None], 0)
+        mean = np.einsum('ij,ij->i', w, np.where(valid, y, 0))
+        residual = np.where(valid, y - mean[:, None], 0)
+        wy = w * residual
+        yy = np.einsum('ij,ij->i', wy, residual)[:, None]
+
+        if method == 'fast':
+            sums = _trig_sums_fft(tt, w, valid, frequencies)
+            sums_y = _trig_sums_fft(tt, wy, valid, frequencies)
+            sums2 = _trig_sums_fft(2 * tt, w, valid, frequencies)
+        elif method == 'direct':
+            sums = _trig_sums_direct(tt, w, frequencies)
+            sums_y = _trig_sums_direct(tt, wy, frequencies)
+            sums2 = _trig_sums_direct(2 * tt, w, frequencies)
+        else:
+            raise ValueError(f"Unknown Lomb-Scargle method {method!r}")
+
+        c, s = sums.real, sums.imag
+        yc, ys = sums_y.real, sums_y.imag
+        # sum w cos^2 and sum w cos sin from the double angle.
+        wcc = (1 + sums2.real) / 2
+        cc = wcc - c * c
+        cs = sums2.imag / 2 - c * s
+        ss = (1 - wcc) - s * s
+        return (ss * yc * yc + cc * ys * ys - 2 * cs * yc * ys) / (yy * (cc * ss - cs * cs))
+
+
+def excess_variance_batch(y, dy, valid, min_significance=3):
+    # Excess variance (sample variance minus mean squared error), its normalised form (over mean^2), the
+    # error of that (Vaughan et al. 2003, eq. 11) and the fractional variability F_var. The cts are
+    # difference-imaging counts, so the normalised values are NaN unless the mean is positive by at
+    # least min_significance standard errors.
+    n = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, y, 0).sum(axis=1) / n
+        residual = np.where(valid, y - mean[:, None], 0)
+        variance = np.einsum('ij,ij->i', residual, residual) / (n - 1)
+        mse = np.where(valid, dy * dy, 0).sum(axis=1) / n
+        excess = variance - mse
+        mean = np.where(mean > min_significance * np.sqrt(variance / n), mean, np.nan)
+        nxs = excess / (mean * mean)
+        f_var = np.sqrt(np.maximum(nxs, 0))
+        nxs_err = np.sqrt((np.sqrt(2 / n) * mse / mean ** 2) ** 2 + (np.sqrt(mse / n) * 2 * f_var / np.abs(mean)) ** 2)
+    return excess, nxs, nxs_err, f_var
+
+
+def structure_function_slope(t, y, dy, valid, n_lags=12, min_pairs=10):
+    # Noise-subtracted first-order structure function on a geometric set of index lags (the cadence is
+    # regular, so index lag tracks time lag), then the per-object least-squares slope of log SF
+    # against log mean time lag over the lags with a positive SF.
+    n_objects, width = y.shape
+    lags = np.unique(np.geomspace(1, max(width // 2, 1), n_lags).astype(int))
+    log_tau = np.full((n_objects, len(lags)), np.nan)
+    log_sf = np.full((n_objects, len(lags)), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i, lag in enumerate(lags):
+            if lag >= width:
+                continue
+            pairs = valid[:, lag:] & valid[:, :-lag]
+            n_pairs = pairs.sum(axis=1)
+            dy_pair = np.where(pairs, y[:, lag:] - y[:, :-lag], 0)
+            noise = np.where(pairs, dy[:, lag:] ** 2 + dy[:, :-lag] ** 2, 0)
+            sf = (np.einsum('ij,ij->i', dy_pair, dy_pair) - noise.sum(axis=1)) / n_pairs
+            tau = np.where(pairs, t[:, lag:] - t[:, :-lag], 0).sum(axis=1) / n_pairs
+            usable = (n_pairs >= min_pairs) & (sf > 0) & (tau > 0)
+            log_sf[usable, i] = np.log10(sf[usable])
+            log_tau[usable, i] = np.log10(tau[usable])
+
+        used = np.isfinite(log_sf)
+        n = used.sum(axis=1)
+        x = np.where(used, log_tau, 0)
+        z = np.where(used, log_sf, 0)
+        sx, sz = x.sum(axis=1), z.sum(axis=1)
+        slope = (n * (x * z).sum(axis=1) - sx * sz) / (n * (x * x).sum(axis=1) - sx * sx)
+    slope[n < 3] = np.nan
+    return slope
+
+
+def extract_features(curves, frequencies, oversample=5):
+    # Feature table for a block of clipped light curve frames (None for missing ones), one row each.
+    # oversample must be the one frequencies was built with; it sets the number of independent frequencies.
+    features = pd.DataFrame({name: np.full(len(curves), np.nan) for name in feature_columns})
+    present = [i for i, curve in enumerate(curves) if curve is not None and len(curve) > 0]
+    if not present:
+        return features
+
+    t, y, dy, valid = pack_curves([curves[i] for i in present])
+    power = lomb_scargle_batch(t, y, dy, valid, frequencies)
+    n = valid.sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        peak = np.nanargmax(np.where(np.isfinite(power), power, -np.inf), axis=1)
+        peak_power = power[np.arange(len(present)), peak]
+        # Single-frequency false alarm probability scaled by the number of independent frequencies.
+        independent = max(len(frequencies) / oversample, 1)
+        single = np.clip(1 - peak_power, 0, 1) ** ((n - 3) / 2)
+        fap = 1 - (1 - single) ** independent
+    excess, nxs, nxs_err, f_var = excess_variance_batch(y, dy, valid)
+    slope = structure_function_slope(t, y, dy, valid)
+
+    peak_frequency = np.asarray(frequencies)[peak]
+    for name, values in (('N_Points', n), ('LS_Peak_Frequency', peak_frequency), ('LS_Peak_Period', 1 / peak_frequency),
+                         ('LS_Peak_Power', peak_power), ('LS_FAP', fap), ('Excess_Variance_Abs', excess), ('Excess_Variance', nxs),
+                         ('Excess_Variance_Err', nxs_err), ('F_Var', f_var), ('SF_Slope', slope)):
+        features.loc[present, name] = values
+    return features
+
+
+def iter_feature_blocks(repository, names=None, baseline_days=None, max_frequency=2.0, oversample=5, block_size=256):
+    # Clipped curves from a LightCurveRepository, block_size at a time. The frequency grid is fixed from
+    # the first block's longest span (rounded up to a whole day) unless baseline_days is given.
+    frequencies = None
+    block = []
+    for item in repository.iter_curves(names, clipped=True):
+        block.append(item)
+        if len(block) == block_size:
+            frequencies = frequencies if frequencies is not None else _grid_for(block, baseline_days, max_frequency, oversample)
+            yield _feature_block(block, frequencies, oversample)
+            block = []
+    if block:
+        frequencies = frequencies if frequencies is not None else _grid_for(block, baseline_days, max_frequency, oversample)
+        yield _feature_block(block, frequencies, oversample)
+
+
+def _grid_for(block, baseline_days, max_frequency, oversample):
+    if baseline_days is None:
+        spans = [np.ptp(frame['BTJD'].to_numpy()) for _, _, frame in block if len(frame) > 1]
+        baseline_days = float(np.ceil(max(spans))) if spans else 1.0
+    frequencies = frequency_grid(baseline_days, max_frequency, oversample)
+    logging.info(f"Lomb-Scargle grid: {len(frequencies)} frequencies, {frequencies[0]:.4f}-{frequencies[-1]:.4f} "
+                 f"cycles/day (baseline {baseline_days} days)")
+    return frequencies
+
+
+def _feature_block(block, frequencies, oversample):
+    features = extract_features([frame for _, _, frame in block], frequencies, oversample)
+    features.insert(0, 'CCD', [str(location.ccd) for _, location, _ in block])
+    features.insert(0, 'Camera', [str(location.cam) for _, location, _ in block])
+    features.insert(0, 'Sector', [location.sector for _, location, _ in block])
+    features.insert(0, 'Name', [name for name, _, _ in block])
+    return features
+
+
+def write_feature_table(features, output_file):
+    if output_file.endswith('.npz'):
+        with open(output_file, 'wb') as f:
+            np.savez(f, **{name: features[name].to_numpy(dtype=np.float64 if pd.api.types.is_numeric_dtype(features[name]) else str)
+                           for name in features.columns})
+    else:
+        features.to_csv(output_file, index=False, sep='\t', float_format='%.6e', na_rep='NaN')
+    return output_file
+
+
+def write_sector_features(root, output_file, sectors=None, cache_directory=None, baseline_days=None,
+                          max_frequency=2.0, oversample=5, block_size=256, sigma=3, maxiters=5):
+    # The feature pass over every clipped light curve under root; MAIN.py runs it after the results
+    # tables with --features, reading the curves back through the binary cache.
+    from LightCurveRepository import LightCurveRepository
+
+    # Each curve is visited once, so the repository only needs to hold about one block of frames.
+    repository = LightCurveRepository(root, sectors, cache_directory, memory_limit_mb=64, sigma=sigma, maxiters=maxiters)
+    blocks = list(iter_feature_blocks(repository, None, baseline_days, max_frequency, oversample, block_size))
+    features = pd.concat(blocks, ignore_index=True) if blocks else pd.DataFrame(columns=['Name', 'Sector', 'Camera', 'CCD'] + feature_columns)
+    write_feature_table(features, output_file)
+    logging.info(f"Wrote features for {len(features)} light curves to {output_file}")
+    return len(features)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lomb-Scargle, excess variance and structure function features '
+                                                 'for every clipped light curve.')
+    parser.add_argument('root', help='directory holding sectorNN/camX_ccdY/lc_hyperleda')
+    parser.add_argument('-s', '--sectors', type=int, nargs='*', default=None, help='sectors to include (default: all)')
+    parser.add_argument('--cache-dir', default=None, help='binary light curve cache directory')
+    parser.add_argument('--max-frequency', type=float, default=2.0, help='highest frequency in cycles/day (default: 2)')
+    parser.add_argument('--oversample', type=int, default=5, help='grid points per 1/baseline (default: 5)')
+    parser.add_argument('--baseline', type=float, default=None,
+                        help='baseline in days fixing the shared grid (default: longest span in the first block)')
+    parser.add_argument('--block-size', type=int, default=256, help='light curves processed together')
+    parser.add_argument('-o', '--output', default='variability_features.npz', help='.npz or tab separated table')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    write_sector_features(args.root, args.output, args.sectors, args.cache_dir, args.baseline, args.max_frequency,
+                          args.oversample, args.block_size)
+
+
+if __name__ == "__main__":
+    main()
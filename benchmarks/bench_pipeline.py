@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import resource
+import tempfile
+from types import SimpleNamespace
+from contextlib import contextmanager
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic
+from CatalogIndex import CatalogIndex
+from LightCurve2 import LightCurveData, parse_light_curve, read_light_curve_directory, sigma_clip_mask
+from HistoGauss import histogram_statistics
+from PlotQueue import PlotQueue
+from ResultsStore import write_results_store, read_results
+from CrossMatch import match_catalogs
+from chi2_histo import Chi2Accumulator
+from VariabilityFeatures import extract_features, frequency_grid
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name, items=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self.stages.setdefault(name, {'seconds': 0.0, 'items': 0})
+            record['seconds'] += time.perf_counter() - start
+            record['items'] += items
+            record['peak_rss_mb'] = peak_rss_mb()
+
+    def report(self):
+        rows = []
+        for name, record in self.stages.items():
+            rate = record['items'] / record['seconds'] if record['seconds'] > 0 else float('inf')
+            rows.append({'stage': name, 'seconds': record['seconds'], 'items': record['items'],
+                         'items_per_second': rate, 'peak_rss_mb': record['peak_rss_mb']})
+        return rows
+
+
+def read_synthetic_catalog(path):
+    # The synthetic camera catalogs are plain CSV; this exposes the attributes CatalogIndex reads
+    # from a HyperLedaCsv so the benchmark doesn't need the external catalogs package.
+    rows = np.genfromtxt(path, delimiter=',', names=True, dtype=None, encoding='utf-8', ndmin=1)
+    return SimpleNamespace(objname=rows['objname'].astype(str), objtype=rows['objtype'].astype(str),
+                           agnclass=rows['agnclass'].astype(str), ra=rows['ra'].astype(float),
+                           dec=rows['dec'].astype(float))
+
+
+def bench_light_curves(timer, sector, work_directory, block_size, plot_sample):
+    cache_directory = os.path.join(work_directory, 'lc_cache')
+    plot_directory = os.path.join(work_directory, 'plots')
+    manager = LightCurveData(sector['sector_directory'], plot_directory, plotter=PlotQueue('off'))
+    cached_manager = LightCurveData(sector['sector_directory'], plot_directory, cache_directory, PlotQueue('off'))
+    plot_manager = LightCurveData(sector['sector_directory'], plot_directory, plotter=PlotQueue('immediate'))
+
+    results = []
+    paths = sector['paths']
+    for start in range(0, len(paths), block_size):
+        block = paths[start:start + block_size]
+
+        with timer.stage('load_data (text)', len(block)):
+            frames = [manager.load_data(path) for path in block]
+        with timer.stage('load_data (cache build)', len(block)):
+            for path in block:
+                cached_manager.load_data(path)
+        with timer.stage('load_data (cache hit)', len(block)):
+            frames = [cached_manager.load_data(path) for path in block]
+
+        with timer.stage('sigma_clip_data', len(block)):
+            clipped = [manager.sigma_clip_data(frame) for frame in frames]
+        with timer.stage('sigma_clip_many', len(block)):
+            manager.sigma_clip_many(frames)
+
+        with timer.stage('histogram_statistics', len(block)):
+            for offset, frame in enumerate(clipped):
+                statistics = histogram_statistics(frame['cts'].values, frame['e_cts'].values, 100)
+                if statistics is None:
+                    continue
+                i = start + offset
+                results.append({
+                    'Name': sector['names'][i], 'Objtype': 'G', 'Agnclass': sector['agnclass'][i],
+                    'RA': sector['ra'][i], 'DEC': sector['dec'][i],
+                    'Mean_Flux': statistics.mean_flux, 'Stddev': statistics.stddev, 'Sector': '06',
+                    'Camera': str(sector['cams'][i]), 'CCD': str(sector['ccds'][i]),
+                    'Chi2_Normalized': statistics.chi2_1, 'Chi2_reduced_Normalized': statistics.reduced_chi2_1,
+                    'Chi2_Standardized': statistics.chi2_2, 'Chi2_reduced_Standardized': statistics.reduced_chi2_2,
+                })
+
+        remaining = plot_sample - timer.stages.get('plot_light_curve', {'items': 0})['items']
+        if remaining > 0:
+            sample = clipped[:remaining]
+            with timer.stage('plot_light_curve', len(sample)):
+                for offset, frame in enumerate(sample):
+                    name = sector['names'][start + offset]
+                    plot_manager.plot_light_curve(frame, name, f"{name}_LightCurve.png", 'bench')
+
+    return results
+
+
+def bench_bulk_read(timer, sector):
+    directories = sorted({os.path.dirname(path) for path in sector['paths']})
+    with timer.stage('read_light_curve_directory', len(sector['paths'])):
+        for directory in directories:
+            read_light_curve_directory(directory)
+
+
+def bench_features(timer, sector, block_size=256):
+    # Only one block of clipped curves is held at a time; the shared grid is fixed from the first block,
+    # as VariabilityFeatures.iter_feature_blocks does.
+    frequencies = None
+    paths = sector['paths']
+    for start in range(0, len(paths), block_size):
+        curves = []
+        for path in paths[start:start + block_size]:
+            data = parse_light_curve(path)
+            curves.append(data.iloc[sigma_clip_mask(data['cts'].to_numpy())])
+        if frequencies is None:
+            frequencies = frequency_grid(float(np.ceil(max(np.ptp(curve['BTJD'].to_numpy()) for curve in curves))))
+        with timer.stage('extract_features', len(curves)):
+            extract_features(curves, frequencies)
+
+
+def bench_results(timer, results, work_directory):
+    store_path = os.path.join(work_directory, 'processed_light_curves_sector06.npz')
+    with timer.stage('write_results_store', len(results)):
+        write_results_store(results, store_path)
+    with timer.stage('chi2 aggregation', len(results)):
+        normalized = Chi2Accumulator()
+        standardized = Chi2Accumulator()
+        data = read_results(store_path, columns=['Chi2_reduced_Normalized', 'Chi2_Normalized',
+                                                 'Chi2_reduced_Standardized', 'Chi2_Standardized'])
+        normalized.add(data['Chi2_reduced_Normalized'].values, data['Chi2_Normalized'].values)
+        standardized.add(data['Chi2_reduced_Standardized'].values, data['Chi2_Standardized'].values)
+        normalized.reduced_values()
+        standardized.reduced_values()
+
+
+def bench_crossmatch(timer, sector, work_directory, n_sources, seed):
+    targets = (sector['ra'], sector['dec'])
+    catalogs = []
+    for number in range(2):
+        path = os.path.join(work_directory, f"synthetic_erosita_{number}.fits.gz")
+        synthetic.generate_erosita_catalog(path, n_sources, seed + number, targets)
+        catalogs.append(path)
+
+    kdtree_directory = os.path.join(work_directory, 'kdtree_cache')
+    with timer.stage('crossmatch (cold)', len(sector['ra'])):
+        match_catalogs(sector['ra'], sector['dec'], catalogs, cache_directory=kdtree_directory)
+    with timer.stage('crossmatch (cached tree)', len(sector['ra'])):
+        match = match_catalogs(sector['ra'], sector['dec'], catalogs, cache_directory=kdtree_directory)
+    return int((match['catalog'] >= 0).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the light curve pipeline on synthetic TESS data.')
+    parser.add_argument('-n', '--objects', type=int, default=1000, help='number of synthetic objects')
+    parser.add_argument('--points', type=int, default=1000, help='maximum points per light curve')
+    parser.add_argument('--sources', type=int, default=None,
+                        help='sources per synthetic eRosita catalog (default: max(10 * objects, 10000))')
+    parser.add_argument('--block-size', type=int, default=500, help='objects held in memory at once')
+    parser.add_argument('--plot-sample', type=int, default=20, help='light curves to render')
+    parser.add_argument('--work-dir', default=None, help='reuse generated data here (default: temporary)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help='write the report as JSON to this path')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    work_directory = args.work_dir or tempfile.mkdtemp(prefix='s2agn_bench_')
+    os.makedirs(work_directory, exist_ok=True)
+    timer = StageTimer()
+
+    try:
+        with timer.stage('generate synthetic sector', args.objects):
+            sector = synthetic.generate_sector(os.path.join(work_directory, 'data'), args.objects,
+                                               n_points=args.points, seed=args.seed)
+
+        with timer.stage('catalog index', args.objects):
+            catalog_directory = os.path.join(work_directory, 'data', 'HyperLEDA', 's06')
+            for cam in range(1, 5):
+                index = CatalogIndex(read_synthetic_catalog(os.path.join(catalog_directory, f"hyperleda_s06_cam{cam}.txt")))
+                for agn_class in synthetic.agn_classes:
+                    for obj_name in index.objects_in_class(agn_class):
+                        index.info(obj_name)
+
+        results = bench_light_curves(timer, sector, work_directory, args.block_size, args.plot_sample)
+        bench_bulk_read(timer, sector)
+        bench_features(timer, sector, args.block_size)
+        bench_results(timer, results, work_directory)
+        matched = bench_crossmatch(timer, sector, work_directory, args.sources or max(10 * args.objects, 10000), args.seed)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+    rows = timer.report()
+    print(f"\n{args.objects} objects, {len(results)} with statistics, {matched} eRosita matches")
+    print(f"{'stage':<28}{'seconds':>10}{'items':>10}{'items/s':>12}{'peak RSS MB':>14}")
+    for row in rows:
+        print(f"{row['stage']:<28}{row['seconds']:>10.3f}{row['items']:>10}{row['items_per_second']:>12.1f}"
+              f"{row['peak_rss_mb']:>14.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'objects': args.objects, 'points': args.points, 'stages': rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
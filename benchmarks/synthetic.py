@@ -0,0 +1,98 @@
+import os
+import numpy as np
+
+agn_classes = ['S2', 'S1.5', 'S1.6', 'S1.7', 'S1.8', 'S1.9']
+sector_start_btjd = 1468.27
+cadence_days = 30 / (60 * 24)
+
+
+def object_names(n_objects):
+    return [f"SYN{i:06d}" for i in range(n_objects)]
+
+
+def write_light_curve(path, rng, n_points, missing_fraction=0.01, outlier_fraction=0.005):
+    # Same layout as the lc_*_cleaned files: whitespace separated, '-' for missing values.
+    btjd = sector_start_btjd + np.arange(n_points) * cadence_days
+    level = rng.uniform(20, 2000)
+    noise = rng.uniform(0.5, 0.05 * level)
+    variability = rng.uniform(0, 3) * noise * np.sin(2 * np.pi * btjd / rng.uniform(0.5, 20))
+    cts = level + variability + rng.normal(0, noise, n_points)
+    outliers = rng.random(n_points) < outlier_fraction
+    cts[outliers] += rng.normal(0, 20 * noise, outliers.sum())
+    e_cts = np.abs(rng.normal(noise, 0.1 * noise, n_points))
+    bkg = rng.normal(50, 5, n_points)
+    missing = rng.random(n_points) < missing_fraction
+
+    table = np.column_stack([
+        np.char.mod('%.6f', btjd),
+        np.char.mod('%.4f', cts),
+        np.char.mod('%.4f', e_cts),
+        np.where(missing, '-', np.char.mod('%.4f', bkg)),
+    ])
+    np.savetxt(path, table, fmt='%s', header='BTJD cts e_cts bkg', comments='')
+
+
+def generate_sector(root, n_objects, sector=6, n_points=1000, seed=0):
+    # root/sector06/cam{c}_ccd{d}/lc_hyperleda/lc_<name>_cleaned plus one catalog per camera.
+    rng = np.random.default_rng(seed)
+    names = object_names(n_objects)
+    cams = rng.integers(1, 5, n_objects)
+    ccds = rng.integers(1, 5, n_objects)
+    classes = rng.choice(agn_classes, n_objects)
+    ra = rng.uniform(0, 360, n_objects)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, n_objects)))
+
+    sector_directory = os.path.join(root, f"sector{sector:02d}")
+    paths = []
+    for i, name in enumerate(names):
+        directory = os.path.join(sector_directory, f"cam{cams[i]}_ccd{ccds[i]}", 'lc_hyperleda')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"lc_{name}_cleaned")
+        if not os.path.exists(path):
+            write_light_curve(path, rng, int(rng.integers(n_points // 2, n_points + 1)))
+        paths.append(path)
+
+    catalog_directory = os.path.join(root, 'HyperLEDA', f"s{sector:02d}")
+    os.makedirs(catalog_directory, exist_ok=True)
+    for cam in range(1, 5):
+        with open(os.path.join(catalog_directory, f"hyperleda_s{sector:02d}_cam{cam}.txt"), 'w') as f:
+            f.write("objname,objtype,agnclass,ra,dec\n")
+            for i in np.flatnonzero(cams == cam):
+                f.write(f"{names[i]},G,{classes[i]},{ra[i]:.6f},{dec[i]:.6f}\n")
+
+    return {
+        'sector_directory': sector_directory,
+        'paths': paths,
+        'names': names,
+        'cams': cams,
+        'ccds': ccds,
+        'agnclass': classes,
+        'ra': ra,
+        'dec': dec,
+    }
+
+
+def generate_erosita_catalog(path, n_sources, seed=0, targets=None, target_fraction=0.5):
+    # FITS binary table with the RA/DEC/ML_FLUX/ML_FLUX_ERR columns the eRosita scripts read.
+    # A fraction of the given target positions get a counterpart within a few arcsec.
+    from astropy.io import fits
+
+    rng = np.random.default_rng(seed)
+    ra = rng.uniform(0, 360, n_sources)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, n_sources)))
+    if targets is not None:
+        target_ra, target_dec = targets
+        chosen = np.flatnonzero(rng.random(len(target_ra)) < target_fraction)[:n_sources]
+        offset = rng.uniform(0, 10, len(chosen)) / 3600
+        ra[:len(chosen)] = (target_ra[chosen] + offset) % 360
+        dec[:len(chosen)] = np.clip(target_dec[chosen] + offset, -90, 90)
+
+    flux = 10 ** rng.uniform(-15, -12, n_sources)
+    columns = fits.ColDefs([
+        fits.Column(name='RA', format='D', array=ra),
+        fits.Column(name='DEC', format='D', array=dec),
+        fits.Column(name='ML_FLUX', format='E', array=flux),
+        fits.Column(name='ML_FLUX_ERR', format='E', array=flux * rng.uniform(0.05, 0.5, n_sources)),
+    ])
+    fits.BinTableHDU.from_columns(columns).writeto(path, overwrite=True)
+    return path
@@ -1,29 +1,29 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats
 import glob
 import os
-import pandas as pd
+import argparse
+from ResultsStore import read_results
+from PlotQueue import load_pyplot
+
+chi2_columns = ['Chi2_reduced_Normalized', 'Chi2_reduced_Standardized', 'Chi2_Normalized', 'Chi2_Standardized']
 
 def process_file(file_path):
     try:
-        with open(file_path, 'r') as f:
-            header = f.readline().strip()
-        columns = header.split()
-        data = pd.read_csv(file_path, delim_whitespace=True, names=columns, skiprows=1)
+        data = read_results(file_path, columns=chi2_columns)
 
     except Exception as e:
         print(f"Error reading {file_path}: {str(e)}")
-        return None, None
+        return None, None, None, None
 
     print(f"\nColumns in {file_path}:")
     print(data.columns.tolist())
 
     if 'Chi2_reduced_Normalized' not in data.columns or 'Chi2_reduced_Standardized' not in data.columns:
         print(f"Error: Required reduced columns not found in {file_path}")
-        return None, None
+        return None, None, None, None
     if 'Chi2_Normalized' not in data.columns or 'Chi2_Standardized' not in data.columns:
         print(f"Error: Required columns not found in {file_path}")
+        return None, None, None, None
 
     normalized_reduced_chi2 = data['Chi2_reduced_Normalized'].values
     standardized_reduced_chi2 = data['Chi2_reduced_Standardized'].values
@@ -32,19 +32,52 @@ def process_file(file_path):
 
     return normalized_reduced_chi2, standardized_reduced_chi2, normalized_chi2, standardized_chi2
 
-def plot_histogram_with_pdf(reduced_chi2_values, chi2_values, title, output_path):
-    if chi2_values is None or len(chi2_values) == 0:
-        print(f"Warning: No data to plot for {title}")
-        return
-    reduced_chi2values = np.array(reduced_chi2_values)
-    chi2_values = np.array(chi2_values)
+
+class Chi2Accumulator:
+    # Streams one chi2 / reduced chi2 pair of columns across many tables. Raw chi2 values are reduced
+    # to a running count and top-N tail; reduced chi2 values are either kept as one chunk per file and
+    # joined once at the end, or binned straight into a fixed-edge histogram when edges are given.
+    def __init__(self, edges=None, top_n=50):
+        self.edges = None if edges is None else np.asarray(edges, dtype=float)
+        self.hist_counts = None if edges is None else np.zeros(len(self.edges) - 1)
+        self.top_n = top_n
+        self.chunks = []
+        self.count = 0
+        self.reduced_max = -np.inf
+        self.top = np.array([])
+
+    def add(self, reduced_chi2_values, chi2_values):
+        reduced_chi2_values = np.asarray(reduced_chi2_values, dtype=float)
+        chi2_values = np.asarray(chi2_values, dtype=float)
+        self.count += len(chi2_values)
+        if len(reduced_chi2_values) > 0:
+            self.reduced_max = max(self.reduced_max, np.max(reduced_chi2_values))
+        if self.edges is None:
+            self.chunks.append(reduced_chi2_values)
+        else:
+            self.hist_counts += np.histogram(reduced_chi2_values, bins=self.edges)[0]
+        self.top = np.sort(np.concatenate([self.top, chi2_values]))[-self.top_n:]
+
+    def reduced_values(self):
+        if not self.chunks:
+            return np.array([])
+        return np.concatenate(self.chunks)
+
+
+def draw_chi2_histograms(title, output_path, df, reduced_max, top_50, reduced_chi2_values=None, histogram=None):
+    from scipy import stats
+    plt = load_pyplot()
     plt.figure(figsize=(15, 6))
     plt.subplot(121)
 
-    if len(reduced_chi2_values) > 0:
-        n, bins, _ = plt.hist(reduced_chi2_values, bins=30, density=True, alpha=0.7, edgecolor='black')
-        x = np.linspace(0, max(reduced_chi2_values), 1000)
-        df = len(chi2_values / reduced_chi2_values)
+    if df > 0:
+        if histogram is not None:
+            counts, edges = histogram
+            density = counts / (counts.sum() * np.diff(edges)) if counts.sum() > 0 else counts
+            plt.stairs(density, edges, fill=True, alpha=0.7, edgecolor='black')
+        else:
+            n, bins, _ = plt.hist(reduced_chi2_values, bins=30, density=True, alpha=0.7, edgecolor='black')
+        x = np.linspace(0, reduced_max, 1000)
         chi2_x = x * df
         chi2_pdf = stats.chi2.pdf(chi2_x, df)
 
@@ -58,7 +91,6 @@ def plot_histogram_with_pdf(reduced_chi2_values, chi2_values, title, output_path
         plt.text(0.5, 0.5, "No positive values to plot", ha='center', va='center')
 
     plt.subplot(122)
-    top_50 = np.sort(chi2_values)[-50:]
     plt.hist(top_50, bins=10, edgecolor='black')
     plt.title(f'{title} - Top 50 Values')
     plt.xlabel('Reduced Chi2')
@@ -70,15 +102,60 @@ def plot_histogram_with_pdf(reduced_chi2_values, chi2_values, title, output_path
 
     print(f"Plot saved: {output_path}")
 
-def main():
-    txt_files = glob.glob('*.txt')
+def reduced_chi2_edges(file_paths, column, bins=30):
+    # Cheap first pass for the combined histograms: only the reduced chi2 column of each table is read
+    # to find the finite range, so the second pass can bin every file online. The edges are the ones
+    # np.histogram(values, bins) would pick for the joined column.
+    low, high = np.inf, -np.inf
+    for file_path in file_paths:
+        try:
+            values = read_results(file_path, columns=[column])[column].to_numpy(dtype=float)
+        except Exception:
+            continue
+        values = values[np.isfinite(values)]
+        if len(values):
+            low, high = min(low, values.min()), max(high, values.max())
+    if not np.isfinite(low):
+        return None
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+def plot_histogram_with_pdf(reduced_chi2_values, chi2_values, title, output_path):
+    if chi2_values is None or len(chi2_values) == 0:
+        print(f"Warning: No data to plot for {title}")
+        return
+    reduced_chi2_values = np.array(reduced_chi2_values)
+    chi2_values = np.array(chi2_values)
+    df = len(chi2_values / reduced_chi2_values)
+    reduced_max = max(reduced_chi2_values) if len(reduced_chi2_values) > 0 else 0
+    draw_chi2_histograms(title, output_path, df, reduced_max, np.sort(chi2_values)[-50:],
+                         reduced_chi2_values=reduced_chi2_values)
+
+def plot_accumulated(accumulator, title, output_path):
+    if accumulator.count == 0:
+        print(f"Warning: No data to plot for {title}")
+        return
+    histogram = None
+    reduced_chi2_values = None
+    if accumulator.edges is not None:
+        histogram = (accumulator.hist_counts, accumulator.edges)
+    else:
+        reduced_chi2_values = accumulator.reduced_values()
+    draw_chi2_histograms(title, output_path, accumulator.count, accumulator.reduced_max, accumulator.top,
+                         reduced_chi2_values=reduced_chi2_values, histogram=histogram)
+
+def main(pattern='processed_light_curves*.npz', edges=None, bins=30):
+    txt_files = glob.glob(pattern)
     total_files = len(txt_files)
     valid_files = 0
 
-    all_normalized_reduced_chi2 = np.array([])
-    all_standardized_reduced_chi2 = np.array([])
-    all_normalized_chi2 = np.array([])
-    all_standardized_chi2 = np.array([])
+    # Without fixed edges, a first pass over the reduced chi2 columns picks each test's range, so the
+    # combined histograms are always binned online and never hold every file's values.
+    normalized_edges = edges if edges is not None else reduced_chi2_edges(txt_files, 'Chi2_reduced_Normalized', bins)
+    standardized_edges = edges if edges is not None else reduced_chi2_edges(txt_files, 'Chi2_reduced_Standardized', bins)
+    normalized_accumulator = Chi2Accumulator(normalized_edges)
+    standardized_accumulator = Chi2Accumulator(standardized_edges)
 
     for file_path in txt_files:
         normalized_reduced_chi2, standardized_reduced_chi2, normalized_chi2, standardized_chi2 = process_file(file_path)
@@ -90,10 +167,8 @@ def main():
             print(f"Normalized Chi2: {len(normalized_chi2)} values, {np.sum(normalized_chi2 > 0)} positive")
             print(f"Standardized Chi2: {len(standardized_chi2)} values, {np.sum(standardized_chi2 > 0)} positive")
 
-            all_normalized_reduced_chi2 = np.concatenate([all_normalized_reduced_chi2, normalized_reduced_chi2])
-            all_standardized_reduced_chi2 = np.concatenate([all_standardized_reduced_chi2, standardized_reduced_chi2])
-            all_normalized_chi2 = np.concatenate([all_normalized_chi2, normalized_chi2])
-            all_standardized_chi2 = np.concatenate([all_standardized_chi2, standardized_chi2])
+            normalized_accumulator.add(normalized_reduced_chi2, normalized_chi2)
+            standardized_accumulator.add(standardized_reduced_chi2, standardized_chi2)
 
             output_dir = f'output_{os.path.splitext(file_path)[0]}'
             os.makedirs(output_dir, exist_ok=True)
@@ -109,16 +184,30 @@ def main():
 
     if valid_files > 0:
         os.makedirs('combined_output', exist_ok=True)
-        plot_histogram_with_pdf(all_normalized_reduced_chi2, all_normalized_chi2,
-                                'Combined Normalized Chi2',
-                                'combined_output/combined_normalized_chi2_histogram.png')
-        plot_histogram_with_pdf(all_standardized_reduced_chi2, all_standardized_chi2,
-                                'Combined Standardized Chi2',
-                                'combined_output/combined_standardized_chi2_histogram.png')
+        plot_accumulated(normalized_accumulator,
+                         'Combined Normalized Chi2',
+                         'combined_output/combined_normalized_chi2_histogram.png')
+        plot_accumulated(standardized_accumulator,
+                         'Combined Standardized Chi2',
+                         'combined_output/combined_standardized_chi2_histogram.png')
     print(f"\nProcessing complete.")
     print(f"Total files processed: {total_files}")
     print(f"Files with valid data: {valid_files}")
     print("Check the output directories for results.")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Reduced chi2 histograms for processed light curve tables.')
+    parser.add_argument('pattern', nargs='?', default='processed_light_curves*.npz',
+                        help='glob for result stores or text tables (default: processed_light_curves*.npz)')
+    parser.add_argument('--hist-range', type=float, nargs=2, metavar=('LOW', 'HIGH'),
+                        help='fixed range for the combined reduced chi2 histograms (default: the data range, '
+                             'found in a first pass over the tables)')
+    parser.add_argument('--hist-bins', type=int, default=30, help='number of bins in the combined histograms (default: 30)')
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    edges = None
+    if args.hist_range is not None:
+        edges = np.linspace(args.hist_range[0], args.hist_range[1], args.hist_bins + 1)
+    main(args.pattern, edges, args.hist_bins)
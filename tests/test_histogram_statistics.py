@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from HistoGauss import HistoGaussData, histogram_statistics
+from LightCurve2 import LightCurveData
+from PlotQueue import PlotQueue
+
+
+def legacy_statistics(tmp_path, clipped_data, num_bins):
+    # The per-object path histogram_statistics replaced: pandas weighted stddev, stats.norm.fit
+    # with np.histogram, and calculate_chi2 against explicit expected/error arrays.
+    light_curve_data = LightCurveData(str(tmp_path), str(tmp_path / 'plots'), plotter=PlotQueue('off'))
+    processor = HistoGaussData(str(tmp_path), str(tmp_path / 'histograms'), light_curve_data, PlotQueue('off'))
+
+    mean_flux, stddev, weighted_stddev = light_curve_data.calculate_weighted_standard_deviation(clipped_data)
+    test1_data = (clipped_data['cts'] / stddev).to_numpy()
+    n1, bins1, mu1, sigma1 = processor.histogram_stats(test1_data, num_bins)
+    chi2_1 = processor.calculate_chi2(test1_data, np.full_like(test1_data, mu1), np.full_like(test1_data, sigma1))
+
+    test2_data = (clipped_data['cts'] / clipped_data['e_cts']).to_numpy()
+    test2_data = test2_data[np.isfinite(test2_data)]
+    n2, bins2, mu2, sigma2 = processor.histogram_stats(test2_data, num_bins)
+    chi2_2 = processor.calculate_chi2(test2_data, np.zeros_like(test2_data), np.ones_like(test2_data))
+    return {
+        'mean_flux': mean_flux, 'stddev': stddev, 'weighted_stddev': weighted_stddev,
+        'mu1': mu1, 'sigma1': sigma1, 'chi2_1': chi2_1[0], 'reduced_chi2_1': chi2_1[1], 'hist1': (n1, bins1),
+        'mu2': mu2, 'sigma2': sigma2, 'chi2_2': chi2_2[0], 'reduced_chi2_2': chi2_2[1], 'hist2': (n2, bins2),
+    }
+
+
+def light_curves():
+    rng = np.random.default_rng(3)
+    for n, level, noise in ((500, 100.0, 5.0), (40, -3.0, 0.5), (2000, 1e5, 300.0), (3, 1.0, 1.0)):
+        cts = rng.normal(level, noise, n)
+        e_cts = np.abs(rng.normal(noise, noise / 10, n))
+        yield pd.DataFrame({'BTJD': np.arange(n, dtype=np.float64), 'cts': cts, 'e_cts': e_cts})
+    # Zero and NaN errors only drop points from Test 2.
+    cts = rng.normal(10.0, 2.0, 200)
+    e_cts = np.abs(rng.normal(2.0, 0.2, 200))
+    e_cts[[5, 17]] = 0.0
+    e_cts[[40, 41]] = np.nan
+    yield pd.DataFrame({'BTJD': np.arange(200, dtype=np.float64), 'cts': cts, 'e_cts': e_cts})
+
+
+@pytest.mark.parametrize('num_bins', [30, 100])
+def test_kernel_matches_legacy_path(tmp_path, num_bins):
+    for clipped_data in light_curves():
+        expected = legacy_statistics(tmp_path, clipped_data, num_bins)
+        statistics = histogram_statistics(clipped_data['cts'], clipped_data['e_cts'], num_bins)
+
+        assert statistics.n_points == len(clipped_data)
+        for name in ('mean_flux', 'stddev', 'weighted_stddev', 'mu1', 'sigma1', 'chi2_1', 'reduced_chi2_1',
+                     'mu2', 'sigma2', 'chi2_2', 'reduced_chi2_2'):
+            np.testing.assert_allclose(getattr(statistics, name), expected[name], rtol=1e-10, atol=1e-12, err_msg=name)
+        for name in ('hist1', 'hist2'):
+            counts, edges = getattr(statistics, name)
+            expected_counts, expected_edges = expected[name]
+            np.testing.assert_allclose(counts, expected_counts, rtol=1e-10, err_msg=name)
+            np.testing.assert_allclose(edges, expected_edges, rtol=1e-12, atol=1e-12, err_msg=name)
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_unusable_curves_return_none():
+    assert histogram_statistics(np.array([1.0, 1.0, 1.0]), np.ones(3)) is None
+    assert histogram_statistics(np.array([1.0, 2.0, 3.0]), np.full(3, np.nan)) is None
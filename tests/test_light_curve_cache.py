@@ -0,0 +1,47 @@
+import numpy as np
+from LightCurve2 import read_light_curve
+import LightCurveCache
+
+
+def write_light_curve(path):
+    path.write_text("BTJD cts e_cts flag\n1.5 10.0 0.5 0\n2.5 - 0.6 1\n3.5 12.0 0.7 0\n")
+    return str(path)
+
+
+def test_cached_frame_is_a_view_of_the_cache_file(tmp_path):
+    source = write_light_curve(tmp_path / 'lc_test_cleaned')
+    cache_directory = str(tmp_path / 'cache')
+
+    parsed = read_light_curve(source, cache_directory)
+    cached = read_light_curve(source, cache_directory)
+
+    assert list(cached.columns) == ['BTJD', 'cts', 'e_cts']
+    np.testing.assert_array_equal(cached.to_numpy(), parsed.to_numpy())
+
+    memmap = cached['cts'].to_numpy()
+    while not isinstance(memmap, np.memmap):
+        memmap = memmap.base
+    for name in cached.columns:
+        assert np.shares_memory(cached[name].to_numpy(), memmap)
+
+
+def test_cache_block_matches_columns(tmp_path):
+    source = write_light_curve(tmp_path / 'lc_test_cleaned')
+    cache_directory = str(tmp_path / 'cache')
+    read_light_curve(source, cache_directory)
+
+    names, block = LightCurveCache.read_cache_block(source, cache_directory)
+    columns = LightCurveCache.read_cache(source, cache_directory)
+    assert block.shape == (3, 3) and block.flags.c_contiguous
+    for row, name in enumerate(names):
+        np.testing.assert_array_equal(block[row], columns[name])
+
+
+def test_unwritable_cache_still_returns_the_parsed_curve(tmp_path):
+    source = write_light_curve(tmp_path / 'lc_test_cleaned')
+    blocker = tmp_path / 'notadir'
+    blocker.write_text('')
+
+    data = read_light_curve(source, str(blocker / 'lc_cache'))
+
+    np.testing.assert_array_equal(data['cts'].to_numpy(), [10.0, np.nan, 12.0])
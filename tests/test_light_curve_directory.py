@@ -0,0 +1,21 @@
+import numpy as np
+from LightCurve2 import parse_light_curve, read_light_curve_directory
+
+
+def test_bulk_reader_matches_per_file_parse(tmp_path):
+    files = {
+        'lc_a_cleaned': "BTJD cts e_cts\n1 2 3\n   \n4 5 6\n\n7 8 9",
+        'lc_b_cleaned': "BTJD cts e_cts\n10 11 12\n \t \n13 - 15\n",
+        'lc_c_cleaned': "BTJD e_cts cts flag\n16 17 18 0\n",
+        'lc_d_cleaned': "BTJD cts e_cts\n19 20 21\n",
+    }
+    for name, text in files.items():
+        (tmp_path / name).write_text(text)
+
+    bundle = read_light_curve_directory(str(tmp_path))
+
+    assert bundle.names == ['a', 'b', 'c', 'd']
+    assert list(bundle.lengths) == [3, 2, 1, 1]
+    for i, path in enumerate(bundle.paths):
+        expected = parse_light_curve(path)[list(bundle.columns)].to_numpy()
+        np.testing.assert_array_equal(bundle.curve(i).to_numpy(), expected)
@@ -0,0 +1,37 @@
+import numpy as np
+from ResultsManifest import ResultsManifest
+from PlotQueue import PlotSpool
+
+
+def test_manifest_keeps_keys_and_streams_latest_results(tmp_path):
+    path = str(tmp_path / 'manifest.jsonl')
+    manifest = ResultsManifest(path)
+    manifest.load()
+    manifest.append('a', 'k1', {'Name': 'a', 'Chi2_Standardized': np.float64(1.5)})
+    manifest.append('b', 'k2', None)
+    manifest.append('a', 'k3', {'Name': 'a', 'Chi2_Standardized': 2.5})
+    with open(path, 'a') as f:
+        f.write('{"unit": "c", "key"')
+
+    reloaded = ResultsManifest(path)
+    reloaded.load()
+    assert reloaded.key_for('a') == 'k3' and reloaded.key_for('b') == 'k2' and reloaded.key_for('c') is None
+    assert list(reloaded.iter_results(['b', 'a', 'c'])) == [None, {'Name': 'a', 'Chi2_Standardized': 2.5}, None]
+
+    reloaded.discard('b')
+    reloaded.compact()
+    with open(path) as f:
+        assert len(f.readlines()) == 1
+    assert reloaded.result_for('a') == {'Name': 'a', 'Chi2_Standardized': 2.5}
+    assert reloaded.key_for('b') is None
+
+
+def test_plot_spool_round_trips_specs(tmp_path):
+    specs = [{'kind': 'histogram', 'data': np.arange(i, dtype=np.float64)} for i in range(5)]
+    with PlotSpool(str(tmp_path)) as spool:
+        spool.extend(specs[:2])
+        spool.extend(specs[2:])
+        assert len(spool) == 5
+        for _ in range(2):
+            for expected, spec in zip(specs, spool):
+                np.testing.assert_array_equal(spec['data'], expected['data'])
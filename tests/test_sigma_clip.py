@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from LightCurve2 import pack_light_curves, sigma_clip_batch, sigma_clip_mask
+
+# The per-object reference warns on NaN/inf curves and on curves clipped down to nothing.
+pytestmark = pytest.mark.filterwarnings('ignore::RuntimeWarning')
+
+
+def assert_batch_matches(curves, sigma=3, maxiters=5):
+    values, lengths = pack_light_curves(curves)
+    masks = sigma_clip_batch(values, lengths, sigma, maxiters)
+    for row, curve in enumerate(curves):
+        expected = sigma_clip_mask(np.asarray(curve, dtype=np.float64), sigma, maxiters)
+        np.testing.assert_array_equal(masks[row, :lengths[row]], expected)
+        assert not masks[row, lengths[row]:].any()
+
+
+def test_random_curves_of_mixed_lengths():
+    rng = np.random.default_rng(0)
+    curves = []
+    for _ in range(500):
+        n = int(rng.integers(1, 400))
+        curve = rng.normal(rng.uniform(-1e3, 1e3), rng.uniform(0.1, 50), n)
+        outliers = rng.random(n) < 0.05
+        curve[outliers] += rng.normal(0, 500, outliers.sum())
+        curves.append(curve)
+    assert_batch_matches(curves)
+
+
+def test_ties_and_constant_curves():
+    curves = [
+        np.full(50, 7.0),
+        np.zeros(10),
+        np.array([1.0, 1.0, 1.0, 1.0, 5.0, 5.0, 5.0, 5.0]),
+        np.array([0.0] * 9 + [10.0]),
+        np.repeat([1.0, 2.0, 3.0], 20),
+        np.array([3.0]),
+        np.round(np.random.default_rng(1).normal(0, 1, 300), 1),
+    ]
+    assert_batch_matches(curves)
+    assert_batch_matches(curves, sigma=1)
+
+
+def test_nan_and_inf_curves():
+    curves = [
+        np.array([1.0, np.nan, 2.0, 3.0]),
+        np.array([np.nan] * 5),
+        np.array([1.0, np.inf, 2.0]),
+        np.array([1.0, 2.0, 3.0, 100.0]),
+    ]
+    assert_batch_matches(curves)
+
+
+@pytest.mark.parametrize('offset', [1e6, 1e9, -1e12])
+def test_large_offsets(offset):
+    rng = np.random.default_rng(2)
+    curves = [offset + rng.normal(0, scale, 200) for scale in (1e-3, 1.0, 10.0)]
+    curves.append(offset + np.concatenate([rng.normal(0, 1, 100), [50.0, -60.0]]))
+    assert_batch_matches(curves)
+    assert_batch_matches(curves, sigma=2, maxiters=10)
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+from LightCurve2 import sigma_clip_mask, stitch_light_curves
+
+
+def sector(btjd, level, rng, noise=1.0):
+    return pd.DataFrame({'BTJD': btjd, 'cts': level + rng.normal(0, noise, len(btjd)),
+                         'e_cts': np.full(len(btjd), noise)})
+
+
+def test_sectors_with_negative_and_near_zero_means_line_up():
+    rng = np.random.default_rng(4)
+    frames = [sector(np.arange(100, 200, 0.5), 40.0, rng),
+              sector(np.arange(0, 100, 0.5), -25.0, rng),
+              sector(np.arange(200, 300, 0.5), 0.05, rng)]
+
+    stitched = stitch_light_curves(frames)
+
+    assert len(stitched) == sum(len(frame) for frame in frames)
+    assert np.all(np.diff(stitched['BTJD']) >= 0)
+    np.testing.assert_array_equal(stitched['e_cts'], 1.0)
+    # Every sector is centred on zero with its noise untouched, so nothing is clipped as a sector jump.
+    for start in (0, 100, 200):
+        part = stitched['cts'][(stitched['BTJD'] >= start) & (stitched['BTJD'] < start + 100)]
+        assert abs(np.median(part)) < 1e-12
+        assert 0.8 < np.std(part) < 1.2
+    assert sigma_clip_mask(stitched['cts'].to_numpy()).mean() > 0.98